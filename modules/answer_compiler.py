@@ -0,0 +1,299 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to compile the answer key into a check table
+
+"""
+
+import os
+import json
+import hashlib
+import pathlib
+import sqlite3 as sql
+import logging
+import pandas as pd
+
+from modules.cache_helper import cache_helper
+
+class answer_compiler(object):
+
+    # Bump when the compiled tables change (see cache_helper)
+    compiler_version = '3'
+
+    # check fields read by the validators, one column each
+    check_fields = ['action', 'action_text', 'value', 'tag', 'tag_ds', 'tag_name']
+
+    # answer_checks columns the validators query, categories are looked up by check_id afterwards
+    check_columns = ['check_index', 'answer_id', 'check_id'] + check_fields
+
+    # answer_data rows parsed and written per step while compiling
+    compile_chunk_size = 1000
+    # uids per IN (...) query, below the SQLite host parameter limit
+    query_chunk_size = 500
+
+    def __init__(self, key_file=None):
+
+        # compiled answer key (SQLite), written by the parent and opened read-only by workers
+        self.key_file = key_file
+
+    # ---------------------------------
+    # Compile
+    # ---------------------------------
+
+    def compile_answer_key(self, answer_db_file, answer_digest=None):
+        """Compile answer_db_file into key_file, unless key_file was already compiled from the same answer DB.
+
+        The key is written to a temporary file next to key_file and moved into place when complete,
+        so workers of another run reading key_file never see it half written.
+        """
+
+        answer_digest = answer_digest if answer_digest is not None else self.md5sum_file(answer_db_file)
+        signature = f'{self.compiler_version}|{answer_digest}'
+
+        if cache_helper(self.key_file).read_signature() == signature:
+            logging.info(f'Answer Key Loaded From Cache: {self.key_file}')
+            return
+
+        temp_file = f'{self.key_file}.{os.getpid()}.tmp'
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+        key_cache = cache_helper(temp_file, signature)
+        answer_db_conn = sql.connect(answer_db_file)
+        conn = key_cache.connect()
+        try:
+            # stream the answer key, the full AnswerData column is never held in memory
+            answer_count = 0
+            check_count = 0
+            for answer_data in pd.read_sql("SELECT * FROM answer_data", answer_db_conn, chunksize=self.compile_chunk_size):
+                answer_rows, check_data = self.compile_answer_data(answer_data, answer_count, check_count)
+                answer_rows.to_sql('answer_rows', conn, if_exists='append')
+                check_data.to_sql('answer_checks', conn, if_exists='append', dtype={'answer_id': 'INTEGER', 'check_id': 'INTEGER'})
+                answer_count += len(answer_rows)
+                check_count += len(check_data)
+
+            if answer_count == 0:
+                # empty answer key, still create the tables
+                answer_rows, check_data = self.compile_answer_data(pd.read_sql("SELECT * FROM answer_data LIMIT 0", answer_db_conn))
+                answer_rows.to_sql('answer_rows', conn, if_exists='append')
+                check_data.to_sql('answer_checks', conn, if_exists='append', dtype={'answer_id': 'INTEGER', 'check_id': 'INTEGER'})
+
+            conn.execute("CREATE INDEX idx_answer_rows_sop ON answer_rows (SOPInstanceUID)")
+            conn.execute("CREATE INDEX idx_answer_rows_series ON answer_rows (SeriesInstanceUID)")
+            conn.execute("CREATE INDEX idx_answer_rows_study ON answer_rows (StudyInstanceUID)")
+            conn.execute("CREATE INDEX idx_answer_checks_answer ON answer_checks (answer_id)")
+            conn.execute("CREATE UNIQUE INDEX idx_answer_checks_check ON answer_checks (check_id)")
+            with conn:
+                key_cache.set_signature(conn)
+        except:
+            conn.close()
+            os.remove(temp_file)
+            raise
+        finally:
+            conn.close()
+            answer_db_conn.close()
+
+        os.replace(temp_file, self.key_file)
+
+        logging.info(f'Answer Key Compiled: {answer_count} Records, {check_count} Checks')
+
+    def get_key_file(self, cache_file, answer_digest):
+        """Name the compiled answer key of an answer DB after the compiler version and answer DB digest.
+
+        cache_file 'results/answer_cache.db' gives 'results/answer_cache_<version>_<digest>.db', so runs
+        with different answer keys never share (or recompile) the same file.
+        """
+
+        cache_stem, cache_ext = os.path.splitext(cache_file)
+
+        return f'{cache_stem}_{self.compiler_version}_{answer_digest}{cache_ext}'
+
+    def compile_answer_data(self, answer_data, answer_id_start=0, check_id_start=0):
+
+        # every AnswerData JSON is parsed once, here
+        answer_rows = answer_data.drop(columns=['AnswerData'])
+        answer_rows.index = pd.RangeIndex(answer_id_start, answer_id_start + len(answer_rows), name='answer_id')
+
+        if 'scope' not in answer_rows.columns:
+            answer_rows['scope'] = '<Instance>'
+
+        check_records = []
+
+        for answer_id, answer_json in zip(answer_rows.index, answer_data['AnswerData']):
+            for check_index, check in json.loads(answer_json).items():
+                # check_id identifies a check across the whole answer key, check_index only within its answer row
+                check_record = [answer_id, check_id_start + len(check_records), check_index]
+                check_record.extend(check.get(field) for field in self.check_fields)
+                # categories stay JSON text, they are only written back out
+                check_record.append(json.dumps(check.get('answer_category_v2')))
+                check_records.append(check_record)
+
+        check_data = pd.DataFrame(check_records, columns=['answer_id', 'check_id', 'check_index'] + self.check_fields + ['answer_category_v2'])
+        check_data = check_data.set_index('check_index')
+
+        return answer_rows, check_data
+
+    def md5sum_file(self, file_path):
+
+        file_hash = hashlib.md5()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024*1024), b''):
+                file_hash.update(chunk)
+
+        return file_hash.hexdigest()
+
+    # ---------------------------------
+    # Query
+    # ---------------------------------
+
+    def connect(self):
+
+        # read-only, safe to open from every worker at once
+        return sql.connect(pathlib.Path(os.path.abspath(self.key_file)).as_uri() + '?mode=ro', uri=True)
+
+    def get_answer_count(self):
+
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT COUNT(*) FROM answer_rows").fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_answer_sops(self):
+
+        # only the instances in the answer key, used to batch and find missing files
+        conn = self.connect()
+        try:
+            return [row[0] for row in conn.execute("SELECT DISTINCT SOPInstanceUID FROM answer_rows")]
+        finally:
+            conn.close()
+
+    def get_tag_paths(self):
+
+        # every tag path (tag_ds) referenced by the answer key
+        conn = self.connect()
+        try:
+            return set(row[0] for row in conn.execute("SELECT DISTINCT tag_ds FROM answer_checks") if isinstance(row[0], str) and row[0])
+        finally:
+            conn.close()
+
+    def get_check_counts(self):
+        """Map each SOPInstanceUID to its (check count, pixels_hidden check count), used to predict validation times."""
+
+        conn = self.connect()
+        try:
+            query = """SELECT answer_rows.SOPInstanceUID, COUNT(*), SUM(answer_checks.action = '<pixels_hidden>') FROM answer_checks
+                       JOIN answer_rows ON answer_rows.answer_id = answer_checks.answer_id
+                       GROUP BY answer_rows.SOPInstanceUID"""
+            return {row[0]: (row[1], row[2] or 0) for row in conn.execute(query)}
+        finally:
+            conn.close()
+
+    def get_answer_data(self, sop_uids):
+        """Return (answer_rows, check_data) for the answer rows of sop_uids, in answer key order.
+        Without sop_uids (a batch of files missing from the UID mapping) both are empty, with the answer key columns."""
+
+        answer_rows = []
+        check_data = []
+
+        sop_uids = list(sop_uids)
+        check_columns = ', '.join('answer_checks.' + column for column in self.check_columns)
+
+        conn = self.connect()
+        try:
+            for i in range(0, len(sop_uids), self.query_chunk_size):
+                chunk = sop_uids[i:i + self.query_chunk_size]
+                placeholders = ','.join('?' * len(chunk))
+                answer_rows.append(pd.read_sql(f"SELECT * FROM answer_rows WHERE SOPInstanceUID IN ({placeholders})",
+                                               conn, params=chunk, index_col='answer_id'))
+                check_data.append(pd.read_sql(f"""SELECT {check_columns} FROM answer_checks
+                                                  JOIN answer_rows ON answer_rows.answer_id = answer_checks.answer_id
+                                                  WHERE answer_rows.SOPInstanceUID IN ({placeholders})
+                                                  ORDER BY answer_checks.check_id""",
+                                              conn, params=chunk, index_col='check_index'))
+
+            if not answer_rows:
+                answer_rows.append(pd.read_sql("SELECT * FROM answer_rows LIMIT 0", conn, index_col='answer_id'))
+                check_data.append(pd.read_sql(f"SELECT {check_columns} FROM answer_checks LIMIT 0", conn, index_col='check_index'))
+        finally:
+            conn.close()
+
+        # back in answer key order when the uids were queried in several chunks
+        answer_rows = pd.concat(answer_rows).sort_index()
+        check_data = pd.concat(check_data).sort_values('check_id')
+
+        return answer_rows, check_data
+
+    def get_categories(self, check_ids):
+        """Map each check_id to its answer_category_v2 JSON text."""
+
+        categories = {}
+
+        check_ids = [int(check_id) for check_id in check_ids]
+
+        conn = self.connect()
+        try:
+            for i in range(0, len(check_ids), self.query_chunk_size):
+                chunk = check_ids[i:i + self.query_chunk_size]
+                query = f"SELECT check_id, answer_category_v2 FROM answer_checks WHERE check_id IN ({','.join('?' * len(chunk))})"
+                categories.update(conn.execute(query, chunk).fetchall())
+        finally:
+            conn.close()
+
+        return categories
+
+    def get_scope_lookup(self, answer_rows):
+        """Map each new uid to the answer_ids scoped to it: (instance_rows, series_rows, study_rows)."""
+
+        instance_rows = {}
+        series_rows = {}
+        study_rows = {}
+
+        for answer_id, scope, new_instance, new_series, new_study in zip(answer_rows.index, answer_rows['scope'], answer_rows['new_instance'],
+                                                                         answer_rows['new_series'], answer_rows['new_study']):
+            if scope == '<Instance>':
+                instance_rows.setdefault(new_instance, []).append(answer_id)
+            elif scope == '<Series>':
+                series_rows.setdefault(new_series, []).append(answer_id)
+            elif scope in ['<Study>', '<Patient>']:
+                study_rows.setdefault(new_study, []).append(answer_id)
+
+        return instance_rows, series_rows, study_rows
+
+    def get_action_checks(self, check_data):
+        """Map each answer_id to its checks split by action: {answer_id: {action: [(check_index, check_row)]}}."""
+
+        action_checks = {}
+
+        for check_index, check_row in self.get_check_list(check_data):
+            action_checks.setdefault(check_row.answer_id, {}).setdefault(check_row.action, []).append((check_index, check_row))
+
+        return action_checks
+
+    def get_check_list(self, check_data):
+        """Return check_data as [(check_index, check_row)], check_index taken from the index or a check_index column."""
+
+        columns = ['answer_id', 'check_id'] + self.check_fields
+        if 'check_index' in check_data.columns:
+            check_data = check_data.set_index('check_index')
+
+        return [(check_index, check_record(*check_values)) for check_index, *check_values in check_data[columns].itertuples(name=None)]
+
+
+class check_record(object):
+
+    # One check of the answer key, built once per batch and shared by every file it applies to.
+
+    __slots__ = ('answer_id', 'check_id', 'action', 'action_text', 'value', 'tag', 'tag_ds', 'tag_name')
+
+    def __init__(self, answer_id, check_id, action, action_text, value, tag, tag_ds, tag_name):
+
+        self.answer_id = answer_id
+        self.check_id = check_id
+        self.action = action
+        self.action_text = action_text
+        self.value = value
+        self.tag = tag
+        self.tag_ds = tag_ds
+        self.tag_name = tag_name
@@ -68,28 +68,15 @@ class answer_preparer(object):
 
     def convert_ids(self, answer_data, uids_old_to_new):
 
+        # map old uids to new uids of the given answer rows (one batch) column by column,
+        # uids missing from the mapping convert to ''.
+        # Lookups go through dict.get, Series.map(dict) would build a Series of the whole mapping on every call.
         return_data = answer_data.copy()
 
-        return_data['new_study'] = ''
-        return_data['new_series'] = ''
-        return_data['new_instance'] = ''
+        id_columns = {'new_study': 'StudyInstanceUID', 'new_series': 'SeriesInstanceUID', 'new_instance': 'SOPInstanceUID'}
 
-        for index, row in return_data.iterrows():
-
-            study_uid = f'<{row.StudyInstanceUID}>'
-            if study_uid in uids_old_to_new.keys():
-                return_data.at[index,'new_study'] = uids_old_to_new.get(study_uid) if study_uid else ''
-            
-            series_uid = f'<{row.SeriesInstanceUID}>'
-            if series_uid in uids_old_to_new.keys():
-                return_data.at[index,'new_series'] = uids_old_to_new.get(series_uid) if series_uid else ''
-
-            instance_uid = f'<{row.SOPInstanceUID}>'
-            if instance_uid in uids_old_to_new.keys():
-                return_data.at[index,'new_instance'] = uids_old_to_new.get(instance_uid) if instance_uid else ''
+        for new_column, old_column in id_columns.items():
+            old_uids = '<' + return_data[old_column].astype(str) + '>'
+            return_data[new_column] = old_uids.map(uids_old_to_new.get).fillna('')
 
         return return_data
-
-
-
-
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to open SQLite cache files kept between runs
+
+"""
+
+import os
+import sqlite3 as sql
+import logging
+
+class cache_helper(object):
+
+    # A cache file records the signature (cache version and options) it was written
+    # with in its cache_info table. Data written under another signature is never reused.
+
+    def __init__(self, cache_file, signature=None, timeout=5.0):
+
+        self.cache_file = cache_file
+        self.signature = signature
+        # seconds to wait for another process' write lock
+        self.timeout = timeout
+
+    def connect(self):
+        """Open the cache file, creating its folder and cache_info table."""
+
+        cache_dir = os.path.dirname(self.cache_file)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+
+        conn = sql.connect(self.cache_file, timeout=self.timeout)
+        conn.execute("CREATE TABLE IF NOT EXISTS cache_info (key TEXT PRIMARY KEY, value TEXT)")
+
+        return conn
+
+    def open(self, tables, label):
+        """Connect, dropping the cached tables when the file was written under another signature.
+
+        Tables are dropped rather than emptied, their layout may change with the cache version.
+        The caller creates its tables (IF NOT EXISTS) after opening.
+        """
+
+        conn = self.connect()
+
+        signature = self.get_signature(conn)
+        if signature != self.signature:
+            if signature is not None:
+                logging.info(f'{label} Signature Changed: Clearing Cache')
+            with conn:
+                for table in tables:
+                    conn.execute(f"DROP TABLE IF EXISTS {table}")
+                self.set_signature(conn)
+
+        return conn
+
+    def get_signature(self, conn):
+
+        try:
+            row = conn.execute("SELECT value FROM cache_info WHERE key = 'signature'").fetchone()
+        except sql.Error:
+            row = None
+
+        return row[0] if row is not None else None
+
+    def set_signature(self, conn):
+
+        conn.execute("INSERT OR REPLACE INTO cache_info (key, value) VALUES ('signature', ?)", (self.signature,))
+
+    def read_signature(self):
+        """Return the signature of an existing cache file, None when there is no file or no signature."""
+
+        if not os.path.exists(self.cache_file):
+            return None
+
+        conn = sql.connect(self.cache_file, timeout=self.timeout)
+        try:
+            return self.get_signature(conn)
+        finally:
+            conn.close()
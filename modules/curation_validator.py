@@ -11,33 +11,82 @@ import pandas as pd
 import numpy as np
 import json
 import logging
-import string
 import traceback
-from nltk.tokenize import word_tokenize
-from nltk.corpus import stopwords
 import concurrent.futures as futures
 import pydicom
 import easyocr
 import re
+import sys
+import time
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows, OCR memory is not reported there
+    resource = None
+
+from modules.answer_compiler import answer_compiler
+from modules.ocr_cache import ocr_cache
+from modules.region_reader import region_reader
+from modules.text_matcher import text_matcher
 
 # for testing (not requirement)
 # ------------------------------
 # import matplotlib.pyplot as plt
 # ------------------------------
 
+# EasyOCR reader of this process, loaded once on first use by curation_validator.get_ocr_reader
+ocr_reader = None
+
+# text_matcher of this process, created once on first use by curation_validator.get_text_matcher
+matcher = None
+
 
 class curation_validator(object):
 
-    def __init__(self):
+    # order the actions of a file are validated in, by both engines
+    actions = ['<tag_retained>', '<text_notnull>', '<text_retained>', '<text_removed>', '<date_shifted>',
+               '<uid_changed>', '<pixels_hidden>', '<pixels_retained>', '<uid_consistent>', '<patid_consistent>']
+
+    # actions the vector engine evaluates as column operations, the others go through the row validators
+    vector_actions = ['<tag_retained>', '<text_notnull>', '<date_shifted>', '<uid_changed>',
+                      '<pixels_retained>', '<uid_consistent>', '<patid_consistent>']
+
+    # OCR engine of the cached region texts, a different engine or version is never served from the cache
+    ocr_engine = f'easyocr {easyocr.__version__} en'
+
+    # frame regions are read from, burned in annotations of multi-frame images are on every frame
+    ocr_frame = 0
+
+    # Blank region pre-screen: a scaled region (0-255) whose intensity spread and edge pixels are
+    # both at or below these thresholds cannot hold text, it is passed as empty OCR text without OCR.
+    # An edge pixel differs from its right or lower neighbour by more than blank_edge_step.
+    blank_std_threshold = 4.0
+    blank_edge_step = 48
+    blank_edge_pixels = 8
+
+    def __init__(self, ocr_cache_file=None, defer_ocr=False):
         
-        self.stopwords = stopwords.words('english')
-        self.punctuation = list(string.punctuation) + ['“','”','‘','’','``','•']      
+        # text match cache counts when this validator started, get_text_stats reports its own share
+        self.text_stats_start = self.get_text_matcher().get_stats()
+
+        # OCR cache (SQLite) shared by runs and workers, opened on the first pixels_hidden check
+        self.ocr_cache_file = ocr_cache_file
+        self.ocr_cache = None
+
+        # regions validated so far by how their text was found: cached, blank (pre-screened, no OCR) or ocr
+        self.region_counts = {'cached': 0, 'blank': 0, 'ocr': 0}
+
+        # defer_ocr: pixels_hidden checks are written as pending rows and their files collected
+        # in ocr_jobs, for a separate OCR stage (see run_ocr_job) to fill in
+        self.defer_ocr = defer_ocr
+        self.ocr_jobs = []
 
     # ---------------------------------
     # Main functions
     # ---------------------------------
 
-    def get_validation_data(self, file_data, answer_data, uids_old_to_new, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level):
+    def get_validation_data(self, file_data, answer_data, check_data, uids_old_to_new, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level, engine='row'):
 
         error_dicts = []
 
@@ -60,16 +109,19 @@ class curation_validator(object):
         #             error_dicts.append(result)
 
         # else:
-        result = self.validate_files(file_data, answer_data, uids_old_to_new, patids_old_to_new, log_path, log_level)
+        if engine == 'vector':
+            return self.validate_files_vector(file_data, answer_data, check_data, uids_old_to_new, patids_old_to_new, log_path, log_level)
+
+        result = self.validate_files(file_data, answer_data, check_data, uids_old_to_new, patids_old_to_new, log_path, log_level)
         error_dicts.append(result)
 
         #---------------------------
 
-        error_df = pd.concat((pd.DataFrame.from_dict(error_dict, 'index') for error_dict in error_dicts))
+        error_df = pd.concat((error_dict.get_data_frame() for error_dict in error_dicts))
 
         return error_df
 
-    def validate_files(self, file_list, answer_data, uids_old_to_new, patids_old_to_new, log_path, log_level):
+    def validate_files(self, file_list, answer_data, check_data, uids_old_to_new, patids_old_to_new, log_path, log_level):
 
         def initialize_logging(log_path, log_level):
 
@@ -84,75 +136,71 @@ class curation_validator(object):
 
         initialize_logging(log_path, log_level)
 
-        error_dict = {}
+        error_dict = result_buffer()
         error_iter = 0
 
-        for file_index, file_row in file_list.iterrows():
+        # answer rows by the uid their scope matches, and checks by answer row and action
+        compiler = answer_compiler()
+        instance_rows, series_rows, study_rows = compiler.get_scope_lookup(answer_data)
+        action_checks = compiler.get_action_checks(check_data)
+
+        for file_index, file_row in enumerate(file_list):
 
             try:
                 #raise Exception("Testing Exception")
 
-                if 'scope' in answer_data.columns:
-
-                    file_answer_data = \
-                        answer_data[((answer_data.scope == '<Instance>') & (answer_data.new_instance == file_row.instance)) | 
-                                    ((answer_data.scope == '<Series>') & (answer_data.new_series == file_row.series)) | 
-                                    ((answer_data.scope.isin(['<Study>','<Patient>'])) & (answer_data.new_study == file_row.study))]
+                answer_ids = sorted(instance_rows.get(file_row.instance, []) + series_rows.get(file_row.series, []) + study_rows.get(file_row.study, []))
 
-                else:
-                    file_answer_data = answer_data[(answer_data.new_instance == file_row.instance)]
-
-                if not file_answer_data.empty:
-                    answer_df = self.flatten_answer_data(file_answer_data)
+                if answer_ids:
 
                     # tag_retained
                     # --------------------------------------------------------------
-                    tag_retain_check = answer_df[answer_df.action == '<tag_retained>']
+                    tag_retain_check = self.get_file_checks(action_checks, answer_ids, '<tag_retained>')
                     error_iter, error_dict = self.validate_tag_retained(tag_retain_check, file_index, file_row, error_dict, error_iter)
 
                     # text_notnull
                     # --------------------------------------------------------------
-                    text_notnull_check = answer_df[answer_df.action == '<text_notnull>']
+                    text_notnull_check = self.get_file_checks(action_checks, answer_ids, '<text_notnull>')
                     error_iter, error_dict = self.validate_text_notnull(text_notnull_check, file_index, file_row, error_dict, error_iter)
 
                     # text_retained
                     # --------------------------------------------------------------
-                    text_retained_check = answer_df[answer_df.action == '<text_retained>']
+                    text_retained_check = self.get_file_checks(action_checks, answer_ids, '<text_retained>')
                     error_iter, error_dict = self.validate_text_retained(text_retained_check, file_index, file_row, error_dict, error_iter)
 
                     # text_removed
                     # --------------------------------------------------------------
-                    text_removed_check = answer_df[answer_df.action == '<text_removed>']
+                    text_removed_check = self.get_file_checks(action_checks, answer_ids, '<text_removed>')
                     error_iter, error_dict = self.validate_text_removed(text_removed_check, file_index, file_row, error_dict, error_iter)
 
                     # date_shifted
                     # --------------------------------------------------------------
-                    date_shifted_check = answer_df[answer_df.action == '<date_shifted>']
+                    date_shifted_check = self.get_file_checks(action_checks, answer_ids, '<date_shifted>')
                     error_iter, error_dict = self.validate_date_shifted(date_shifted_check, file_index, file_row, error_dict, error_iter)
 
                     # uid_changed
                     # --------------------------------------------------------------
-                    uid_changed_check = answer_df[(answer_df.action == '<uid_changed>')]
+                    uid_changed_check = self.get_file_checks(action_checks, answer_ids, '<uid_changed>')
                     error_iter, error_dict = self.validate_uid_changed(uid_changed_check, file_index, file_row, error_dict, error_iter)
 
                     # pixels_hidden
                     # --------------------------------------------------------------
-                    pixels_hidden_check = answer_df[answer_df.action == '<pixels_hidden>']
+                    pixels_hidden_check = self.get_file_checks(action_checks, answer_ids, '<pixels_hidden>')
                     error_iter, error_dict = self.validate_pixels_hidden(pixels_hidden_check, file_index, file_row, error_dict, error_iter)
                     
                     # pixels_retained
                     # --------------------------------------------------------------
-                    pixels_retained_check = answer_df[answer_df.action == '<pixels_retained>']
+                    pixels_retained_check = self.get_file_checks(action_checks, answer_ids, '<pixels_retained>')
                     error_iter, error_dict = self.validate_pixels_retained(pixels_retained_check, file_index, file_row, error_dict, error_iter)
                     
                     # uid_consistent
                     # --------------------------------------------------------------
-                    uid_consistent_check = answer_df[answer_df.action == '<uid_consistent>']
+                    uid_consistent_check = self.get_file_checks(action_checks, answer_ids, '<uid_consistent>')
                     error_iter, error_dict = self.validate_uid_consistent(uid_consistent_check, file_index, file_row, error_dict, error_iter, uids_old_to_new)
                     
                     # patid_consistent
                     # --------------------------------------------------------------
-                    patid_consistent_check = answer_df[answer_df.action == '<patid_consistent>']
+                    patid_consistent_check = self.get_file_checks(action_checks, answer_ids, '<patid_consistent>')
                     error_iter, error_dict = self.validate_patid_consistent(patid_consistent_check, file_index, file_row, error_dict, error_iter, patids_old_to_new)
 
             except:
@@ -161,20 +209,231 @@ class curation_validator(object):
 
         return error_dict
 
-    def get_missing_validation_data(self, answer_data, multiproc, multiproc_cpus, log_path, log_level):
+    def validate_files_vector(self, file_list, answer_data, check_data, uids_old_to_new, patids_old_to_new, log_path, log_level):
+
+        # Same results as validate_files: the batch's files are joined with their checks once,
+        # the tag level actions are evaluated as column operations over the whole batch.
+
+        def initialize_logging(log_path, log_level):
+
+            logging.basicConfig(
+                level=log_level,
+                format="%(asctime)s - [%(levelname)s] - %(message)s",
+                handlers=[
+                    logging.FileHandler(log_path, 'a'),
+                    logging.StreamHandler()
+                ]
+            )
+
+        initialize_logging(log_path, log_level)
+
+        file_checks = self.get_file_check_table(file_list, answer_data, check_data)
+
+        vector_checks = file_checks[file_checks['action'].isin(self.vector_actions)]
+        row_checks = file_checks[~file_checks['action'].isin(self.vector_actions)]
+
+        result_dfs = []
+
+        try:
+            result_dfs.append(self.validate_vector_checks(vector_checks, file_list, uids_old_to_new, patids_old_to_new))
+        except:
+            # the batch's tag level checks go through the row validators instead,
+            # which log and write an error row per check like validate_files
+            error = traceback.format_exc()
+            logging.error(f'action: validate_files_vector | file_path: None | instance: None | tag: None \n{error}')
+            row_checks = file_checks
+
+        # text and pixel actions, one file and action at a time through the row validators
+        row_validators = {'<tag_retained>': self.validate_tag_retained,
+                          '<text_notnull>': self.validate_text_notnull,
+                          '<text_retained>': self.validate_text_retained,
+                          '<text_removed>': self.validate_text_removed,
+                          '<date_shifted>': self.validate_date_shifted,
+                          '<uid_changed>': self.validate_uid_changed,
+                          '<pixels_hidden>': self.validate_pixels_hidden,
+                          '<pixels_retained>': self.validate_pixels_retained,
+                          '<uid_consistent>': lambda *args: self.validate_uid_consistent(*args, uids_old_to_new),
+                          '<patid_consistent>': lambda *args: self.validate_patid_consistent(*args, patids_old_to_new)}
+
+        error_dict = result_buffer()
+        error_iter = 0
+        compiler = answer_compiler()
+
+        for (file_index, action), group in row_checks.groupby(['file_index', 'action'], sort=False):
+            file_row = file_list[file_index]
+            try:
+                data_check = compiler.get_check_list(group)
+                error_iter, error_dict = row_validators[action](data_check, file_index, file_row, error_dict, error_iter)
+            except:
+                error = traceback.format_exc()
+                logging.error(f'action: validate_files_vector | file_path: {file_row.file_path} | instance: {file_row.instance} | tag: None \n{error}')
+
+        result_dfs.append(error_dict.get_data_frame())
+
+        # back in validate_files order: by file, then action, then answer key order
+        error_df = pd.concat(result_dfs, ignore_index=True)
+        if error_df.empty:
+            return error_df
+
+        action_order = error_df['action'].map({action: i for i, action in enumerate(self.actions)})
+        error_df = error_df.iloc[np.lexsort((action_order.to_numpy(), error_df['file_index'].to_numpy()))]
+
+        # same column types validate_files gets from its dicts, e.g. float scores
+        return error_df.reset_index(drop=True).infer_objects()
+
+    def get_file_check_table(self, file_list, answer_data, check_data):
+
+        # one row per (file, check) pair, matched on the uid of the answer row scope
+        file_keys = pd.DataFrame({'file_index': range(len(file_list)),
+                                  'instance': [file_row.instance for file_row in file_list],
+                                  'series': [file_row.series for file_row in file_list],
+                                  'study': [file_row.study for file_row in file_list]})
+
+        answer_keys = answer_data[['scope', 'new_instance', 'new_series', 'new_study']].rename_axis('answer_id').reset_index()
+
+        file_answers = pd.concat([
+            file_keys.merge(answer_keys[answer_keys['scope'] == '<Instance>'], left_on='instance', right_on='new_instance'),
+            file_keys.merge(answer_keys[answer_keys['scope'] == '<Series>'], left_on='series', right_on='new_series'),
+            file_keys.merge(answer_keys[answer_keys['scope'].isin(['<Study>', '<Patient>'])], left_on='study', right_on='new_study')])
+
+        checks = check_data.reset_index()
+        checks['check_order'] = range(len(checks))
+        checks['action_order'] = checks['action'].map({action: i for i, action in enumerate(self.actions)})
+        checks = checks[checks['action_order'].notna()]
+
+        file_checks = file_answers[['file_index', 'answer_id']].merge(checks, on='answer_id')
+        file_checks = file_checks.sort_values(['file_index', 'action_order', 'check_order']).reset_index(drop=True)
+
+        return file_checks
+
+    def validate_vector_checks(self, checks, file_list, uids_old_to_new, patids_old_to_new):
+
+        count = len(checks)
+
+        action = checks['action'].to_numpy()
+        # object dtype, a batch whose answer values are all missing reads them as a float (NaN) column
+        check_value = checks['value'].astype(object)
+        answer_value = check_value.to_numpy().copy()
+        is_text = check_value.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+
+        # file values of the checked tags
+        tag_dicts = [file_list[file_index].tags for file_index in checks['file_index']]
+        present = np.array([tag_ds in tag_dict for tag_dict, tag_ds in zip(tag_dicts, checks['tag_ds'])], dtype=bool)
+        tag_values = pd.Series([tag_dict.get(tag_ds) for tag_dict, tag_ds in zip(tag_dicts, checks['tag_ds'])], dtype=object)
+        notnull = present & tag_values.notna().to_numpy()
+        tag_text = tag_values.where(notnull, '').to_numpy(dtype=object)
+
+        file_value = np.full(count, None, dtype=object)
+        check_pass = np.full(count, None, dtype=object)
+        check_score = np.full(count, None, dtype=object)
+        failed = np.zeros(count, dtype=bool)
+
+        def set_result(mask, passed):
+            check_pass[mask] = passed[mask].astype(object)
+            check_score[mask] = passed[mask].astype(int).astype(object)
+
+        # tag_retained: the tag has a value
+        # --------------------------------------------------------------
+        mask = action == '<tag_retained>'
+        file_value[mask & notnull] = tag_text[mask & notnull]
+        set_result(mask, notnull)
+
+        # text_notnull: the tag has a non empty value
+        # --------------------------------------------------------------
+        mask = action == '<text_notnull>'
+        file_value[mask & notnull] = tag_text[mask & notnull]
+        set_result(mask, notnull & (tag_text != '<>'))
+
+        # date_shifted, uid_changed: the original value is gone from the tag
+        # --------------------------------------------------------------
+        mask = (action == '<date_shifted>') | (action == '<uid_changed>')
+        file_value[mask & present] = tag_text[mask & present]
+        set_result(mask & ~present, ~present)
+        compare = mask & present & is_text
+        original = check_value[compare].str.replace('<', '', regex=False).str.replace('>', '', regex=False).str.replace('\\', '', regex=False)
+        retained = np.array([original_value in tag_value.replace('\\', '') for original_value, tag_value in zip(original, tag_text[compare])], dtype=bool)
+        check_pass[compare] = (~retained).astype(object)
+        check_score[compare] = (~retained).astype(int).astype(object)
+        failed |= mask & present & ~is_text
+
+        # uid_consistent, patid_consistent: the tag holds the mapped value
+        # --------------------------------------------------------------
+        for mapped_action, id_map in [('<uid_consistent>', uids_old_to_new), ('<patid_consistent>', patids_old_to_new)]:
+            mask = action == mapped_action
+            file_value[mask & present] = tag_text[mask & present]
+            set_result(mask & ~present, ~present)
+            compare = mask & present
+            # dict.get, Series.map(dict) would build a Series of the whole uid/patid map in every batch
+            expected = check_value[compare].map(id_map.get).fillna('').to_numpy(dtype=object)
+            matched = tag_text[compare] == expected
+            check_pass[compare] = matched.astype(object)
+            check_score[compare] = matched.astype(int).astype(object)
+
+        # pixels_retained: the pixel digest matches, the answer value is the expected digest
+        # --------------------------------------------------------------
+        mask = action == '<pixels_retained>'
+        if mask.any():
+            digests = np.array([file_list[file_index].file_digest.strip('<>') for file_index in checks['file_index'][mask]], dtype=object)
+            action_text = checks['action_text'][mask]
+            has_text = action_text.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+            expected = np.array([value.strip('<>') if is_str else None for value, is_str in zip(action_text, has_text)], dtype=object)
+            matched = (digests == expected) & has_text
+            positions = np.flatnonzero(mask)
+            file_value[positions] = digests
+            answer_value[positions[has_text]] = expected[has_text]
+            check_pass[positions[has_text]] = matched[has_text].astype(object)
+            check_score[positions[has_text]] = matched[has_text].astype(int).astype(object)
+            failed[positions[~has_text]] = True
+
+        # answer values that cannot be compared, same as the row validators: logged, no result
+        # --------------------------------------------------------------
+        check_pass[failed] = None
+        check_score[failed] = None
+        for failed_action, file_index, tag_ds in zip(action[failed], checks['file_index'][failed], checks['tag_ds'][failed]):
+            file_row = file_list[file_index]
+            logging.error(f'action: {failed_action.strip("<>")} | file_path: {file_row.file_path} | instance: {file_row.instance} | tag: {tag_ds} \nanswer value is not text')
+
+        files = [file_list[file_index] for file_index in checks['file_index']]
+
+        error_df = pd.DataFrame({
+            'file_index': checks['file_index'].to_numpy(),
+            'check_index': checks['check_index'].to_numpy(),
+            'check_id': checks['check_id'].to_numpy(),
+            'check_passed': check_pass,
+            'check_score': check_score,
+            'action': action,
+            'action_text': checks['action_text'].to_numpy(dtype=object),
+            'file_value': file_value,
+            'answer_value': answer_value,
+            'tag': checks['tag'].to_numpy(dtype=object),
+            'tag_ds': checks['tag_ds'].to_numpy(dtype=object),
+            'tag_name': checks['tag_name'].to_numpy(dtype=object),
+            'modality': [file_row.modality for file_row in files],
+            'class': [file_row['class'] for file_row in files],
+            'patient': [file_row.patient for file_row in files],
+            'study': [file_row.study for file_row in files],
+            'series': [file_row.series for file_row in files],
+            'instance': [file_row.instance for file_row in files],
+            'file_name': None,
+            'file_path': None,
+            'ocr_status': None})
+
+        return error_df
+
+    def get_missing_validation_data(self, answer_data, check_data, multiproc, multiproc_cpus, log_path, log_level):
 
         error_dicts = []
 
-        result = self.validate_missing_files(answer_data, log_path, log_level)
+        result = self.validate_missing_files(answer_data, check_data, log_path, log_level)
         error_dicts.append(result)
 
         #---------------------------
 
-        error_df = pd.concat((pd.DataFrame.from_dict(error_dict, 'index') for error_dict in error_dicts))
+        error_df = pd.concat((error_dict.get_data_frame() for error_dict in error_dicts))
 
         return error_df
 
-    def validate_missing_files(self, answer_data, log_path, log_level):
+    def validate_missing_files(self, answer_data, check_data, log_path, log_level):
 
         def initialize_logging(log_path, log_level):
 
@@ -189,66 +448,66 @@ class curation_validator(object):
 
         initialize_logging(log_path, log_level)
 
-        error_dict = {}
+        error_dict = result_buffer()
         error_iter = 0
 
+        action_checks = answer_compiler().get_action_checks(check_data)
+
         for answer_index, answer_row in answer_data.iterrows():
 
             try:
-                #file_answer_data = answer_row.to_frame()
-                file_answer_data = pd.DataFrame([answer_row])
+                answer_ids = [answer_index]
 
-                if not file_answer_data.empty:
-                    answer_df = self.flatten_answer_data(file_answer_data)
+                if answer_index in action_checks:
 
                     # tag_retained
                     # --------------------------------------------------------------
-                    tag_retain_check = answer_df[answer_df.action == '<tag_retained>']
+                    tag_retain_check = self.get_file_checks(action_checks, answer_ids, '<tag_retained>')
                     error_iter, error_dict = self.validate_tag_retained(tag_retain_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # text_notnull
                     # --------------------------------------------------------------
-                    text_notnull_check = answer_df[answer_df.action == '<text_notnull>']
+                    text_notnull_check = self.get_file_checks(action_checks, answer_ids, '<text_notnull>')
                     error_iter, error_dict = self.validate_text_notnull(text_notnull_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # text_retained
                     # --------------------------------------------------------------
-                    text_retained_check = answer_df[answer_df.action == '<text_retained>']
+                    text_retained_check = self.get_file_checks(action_checks, answer_ids, '<text_retained>')
                     error_iter, error_dict = self.validate_text_retained(text_retained_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # text_removed
                     # --------------------------------------------------------------
-                    text_removed_check = answer_df[answer_df.action == '<text_removed>']
+                    text_removed_check = self.get_file_checks(action_checks, answer_ids, '<text_removed>')
                     error_iter, error_dict = self.validate_text_removed(text_removed_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # date_shifted
                     # --------------------------------------------------------------
-                    date_shifted_check = answer_df[answer_df.action == '<date_shifted>']
+                    date_shifted_check = self.get_file_checks(action_checks, answer_ids, '<date_shifted>')
                     error_iter, error_dict = self.validate_date_shifted(date_shifted_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # uid_changed
                     # --------------------------------------------------------------
-                    uid_changed_check = answer_df[(answer_df.action == '<uid_changed>')]
+                    uid_changed_check = self.get_file_checks(action_checks, answer_ids, '<uid_changed>')
                     error_iter, error_dict = self.validate_uid_changed(uid_changed_check, answer_index, answer_row, error_dict, error_iter, missing=True)
 
                     # pixels_hidden
                     # --------------------------------------------------------------
-                    pixels_hidden_check = answer_df[answer_df.action == '<pixels_hidden>']
+                    pixels_hidden_check = self.get_file_checks(action_checks, answer_ids, '<pixels_hidden>')
                     error_iter, error_dict = self.validate_pixels_hidden(pixels_hidden_check, answer_index, answer_row, error_dict, error_iter, missing=True)
                     
                     # pixels_retained
                     # --------------------------------------------------------------
-                    pixels_retained_check = answer_df[answer_df.action == '<pixels_retained>']
+                    pixels_retained_check = self.get_file_checks(action_checks, answer_ids, '<pixels_retained>')
                     error_iter, error_dict = self.validate_pixels_retained(pixels_retained_check, answer_index, answer_row, error_dict, error_iter, missing=True)
                     
                     # uid_consistent
                     # --------------------------------------------------------------
-                    uid_consistent_check = answer_df[answer_df.action == '<uid_consistent>']
+                    uid_consistent_check = self.get_file_checks(action_checks, answer_ids, '<uid_consistent>')
                     error_iter, error_dict = self.validate_uid_consistent(uid_consistent_check, answer_index, answer_row, error_dict, error_iter, uids_old_to_new=None, missing=True)
                     
                     # patid_consistent
                     # --------------------------------------------------------------
-                    patid_consistent_check = answer_df[answer_df.action == '<patid_consistent>']
+                    patid_consistent_check = self.get_file_checks(action_checks, answer_ids, '<patid_consistent>')
                     error_iter, error_dict = self.validate_patid_consistent(patid_consistent_check, answer_index, answer_row, error_dict, error_iter, patids_old_to_new=None, missing=True)
 
             except:
@@ -261,48 +520,38 @@ class curation_validator(object):
     # Helper functions
     # ---------------------------------
 
-    def flatten_answer_data(self, answer_data):
+    def get_file_checks(self, action_checks, answer_ids, action):
 
-        answer_dicts = []
+        # (check_index, check_row) of one action for the answer rows of a file, in answer key order
+        return [check for answer_id in answer_ids for check in action_checks.get(answer_id, {}).get(action, [])]
 
-        for index, row in answer_data.iterrows():
-
-            answer_dict = json.loads(row.AnswerData)
-            answer_dicts.append(answer_dict)
-
-        answer_df = pd.concat((pd.DataFrame.from_dict(answer_dict, 'index') for answer_dict in answer_dicts))
-
-        return answer_df
-
-    def log_error(self, error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, passed, score, missing=False):
+    def log_error(self, error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, passed, score, missing=False, ocr_status=None):
 
         # log errors found in validation
-        error_dict[error_iter] = {}
-        error_dict[error_iter]['file_index'] = None if missing else file_index
-        error_dict[error_iter]['check_index'] = check_index
-        error_dict[error_iter]['check_passed'] = passed
-        error_dict[error_iter]['check_score'] = score
-        error_dict[error_iter]['action'] = check_row.action
-        error_dict[error_iter]['action_text'] = check_row.action_text
-        #error_dict[error_iter]['answer_category'] = f'<{str(check_row.answer_category)}>'
-        error_dict[error_iter]['answer_category_v2'] = f'<{json.dumps(check_row.answer_category_v2)}>'
-
-        error_dict[error_iter]['file_value'] = file_value
-        error_dict[error_iter]['answer_value'] = check_row.value        
-        
-        error_dict[error_iter]['tag'] = check_row.tag
-        error_dict[error_iter]['tag_ds'] = check_row.tag_ds
-        #error_dict[error_iter]['tag_keyword'] = check_row.tag_keyword
-        error_dict[error_iter]['tag_name'] = check_row.tag_name
-
-        error_dict[error_iter]['modality'] = file_row.Modality if missing else file_row.modality        
-        error_dict[error_iter]['class'] = file_row.SOPClassUID if missing else file_row['class']         
-        error_dict[error_iter]['patient'] = file_row.PatientID if missing else file_row.patient
-        error_dict[error_iter]['study'] = file_row.StudyInstanceUID if missing else file_row.study
-        error_dict[error_iter]['series'] = file_row.SeriesInstanceUID if missing else file_row.series
-        error_dict[error_iter]['instance'] = file_row.SOPInstanceUID if missing else file_row.instance
-        error_dict[error_iter]['file_name'] = None
-        error_dict[error_iter]['file_path'] = None
+        # one value per result column, categories are looked up later by check_id
+        error_dict.append(
+            None if missing else file_index,
+            check_index,
+            check_row.check_id,
+            passed,
+            score,
+            check_row.action,
+            check_row.action_text,
+            file_value,
+            check_row.value,
+            check_row.tag,
+            check_row.tag_ds,
+            #check_row.tag_keyword,
+            check_row.tag_name,
+            file_row.Modality if missing else file_row.modality,
+            file_row.SOPClassUID if missing else file_row['class'],
+            file_row.PatientID if missing else file_row.patient,
+            file_row.StudyInstanceUID if missing else file_row.study,
+            file_row.SeriesInstanceUID if missing else file_row.series,
+            file_row.SOPInstanceUID if missing else file_row.instance,
+            None,
+            None,
+            ocr_status)
 
         error_iter+=1
 
@@ -314,7 +563,7 @@ class curation_validator(object):
 
     def validate_tag_retained(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -331,7 +580,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys() and not pd.isnull(file_row[check_row.tag_ds]):
+                    if check_row.tag_ds in file_row and not pd.isnull(file_row[check_row.tag_ds]):
                         file_value = file_row[check_row.tag_ds]
                         check_pass = True
                         check_score = 1
@@ -349,7 +598,7 @@ class curation_validator(object):
 
     def validate_text_notnull(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -366,7 +615,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys() and not pd.isnull(file_row[check_row.tag_ds]):
+                    if check_row.tag_ds in file_row and not pd.isnull(file_row[check_row.tag_ds]):
                         file_value = file_row[check_row.tag_ds]
                         if file_value in ['<>']:
                             check_pass = False
@@ -388,7 +637,7 @@ class curation_validator(object):
 
     def validate_text_retained(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -404,7 +653,7 @@ class curation_validator(object):
                 check_score = None
 
                 try:
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else None
                         if file_value:
                             check_value = check_row.action_text if not pd.isnull(check_row.action_text) else None
@@ -426,7 +675,7 @@ class curation_validator(object):
 
     def validate_text_removed(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
                 
             if missing:
                 
@@ -443,7 +692,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else None
                         file_value = '<>' if file_value == '<REMOVED>' else file_value
                         if file_value:
@@ -466,7 +715,7 @@ class curation_validator(object):
 
     def validate_date_shifted(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -483,7 +732,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
 
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else ''
                         check_value = check_row.value.replace('<','').replace('>','')
@@ -508,7 +757,7 @@ class curation_validator(object):
 
     def validate_uid_changed(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -525,7 +774,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
 
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else ''
                         check_value = check_row.value.replace('<','').replace('>','')
@@ -550,7 +799,7 @@ class curation_validator(object):
 
     def validate_pixels_retained(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -567,7 +816,7 @@ class curation_validator(object):
 
                 try:
 
-                    if 'file_digest' in file_row.keys():
+                    if 'file_digest' in file_row:
 
                         file_value = file_row['file_digest'].strip('<>') if not pd.isnull(file_row['file_digest']) else ''
                         check_value = check_row.value = check_row.action_text.strip('<>')
@@ -592,7 +841,7 @@ class curation_validator(object):
 
     def validate_uid_consistent(self, data_check, file_index, file_row, error_dict, error_iter, uids_old_to_new, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -609,7 +858,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
 
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else ''
                         check_value = uids_old_to_new.get(check_row.value, "")
@@ -634,7 +883,7 @@ class curation_validator(object):
     
     def validate_patid_consistent(self, data_check, file_index, file_row, error_dict, error_iter, patids_old_to_new, missing=False):
 
-        for check_index, check_row in data_check.iterrows():
+        for check_index, check_row in data_check:
 
             if missing:
                 
@@ -651,7 +900,7 @@ class curation_validator(object):
 
                 try:
 
-                    if check_row.tag_ds in file_row.keys():
+                    if check_row.tag_ds in file_row:
 
                         file_value = file_row[check_row.tag_ds] if not pd.isnull(file_row[check_row.tag_ds]) else ''
                         check_value = patids_old_to_new.get(check_row.value, "")
@@ -676,83 +925,51 @@ class curation_validator(object):
 
     def validate_text(self, file_value, answer_value, method, missing=False):
 
-        #-----------------------------
-        # Test variables
-        #-----------------------------
-        
-        #file_value = "<The patient's address is 1261 AR 72223>"
-        #answer_value = '<1261 Leawood Street, Little Rock AR 72223>'
+        # memoized, the same file and answer values recur across the instances of a series
+        return self.get_text_matcher().match(file_value, answer_value, method)
 
-        #file_value = "<12>"
-        #answer_value = "<12.0>"
-        
-        #-----------------------------
-        check_pass = False
-        check_score = 0
+    def get_text_matcher(self):
 
-        file_value = file_value.replace('<','').replace('>','').lower()
-        answer_value = answer_value.replace('<','').replace('>','').lower()
+        # one matcher per process, so its caches carry over from batch to batch
+        global matcher
 
-        #-----------------------------
+        if matcher is None:
+            matcher = text_matcher()
 
-        def validate_number(file_value, answer_value, method):
+        return matcher
 
-            file_value_fl = float(file_value)
-            answer_value_fl = float(answer_value)
+    def get_text_stats(self):
+        """Return the (hits, misses) of the text match and answer token caches for the checks validated so far."""
 
-            retain = True if method == 'retain' else False
+        return tuple(count - start for count, start in zip(self.get_text_matcher().get_stats(), self.text_stats_start))
 
-            if answer_value_fl == file_value_fl:
-                check_pass, check_score = (True, 1.0) if retain else (False, 0.0)
-            else:
-                check_pass, check_score = (False, 0.0) if retain else (True, 1.0)
+    def get_ocr_reader(self):
 
-            return check_pass, check_score
+        # Loading the detection and recognition networks takes seconds and hundreds of MB,
+        # so each process loads them once and reuses the reader for every check and batch.
+        global ocr_reader
 
-        def tokenize_and_check(file_value, answer_value, method):
+        if ocr_reader is None:
+            start_time = time.time()
+            start_memory = self.get_peak_memory()
 
-            retain = True if method == 'retain' else False
+            ocr_reader = easyocr.Reader(['en'], verbose=False)
 
-            answer_tokens = [token for token in word_tokenize(answer_value) if token not in (self.stopwords + self.punctuation)]
+            end_memory = self.get_peak_memory()
+            memory_text = f', Peak Memory {start_memory:.0f} MB -> {end_memory:.0f} MB' if end_memory is not None else ''
+            logging.info(f'EasyOCR Reader Loaded (pid {os.getpid()}): {time.time() - start_time:.1f}s{memory_text}')
 
-            total = len(answer_tokens)
-            retained = 0
-            removed = 0
+        return ocr_reader
 
-            for token in answer_tokens:
-                if token in file_value:
-                    retained += 1
-                else:
-                    removed += 1
-
-            if retain:
-                check_pass = True if retained == total else False
-                check_score = (retained / total)
-            else:
-                check_pass = True if removed == total else False
-                check_score = (removed / total)
+    def get_peak_memory(self):
 
-            return check_pass, check_score
+        # peak resident memory of this process in MB, None where it cannot be read
+        if resource is None:
+            return None
 
-        #-----------------------------
-
-        if file_value.replace('.', '', 1).isdigit() and answer_value.replace('.', '', 1).isdigit():
-
-            check_pass, check_score = validate_number(file_value, answer_value, method)
-
-        else:           
-
-            if str(answer_value) in file_value:
-                if method == 'retain':
-                    check_pass = True
-                    check_score = 1.0
-                elif method == 'remove':
-                    check_pass = False
-                    check_score = 0.0
-            else:
-                check_pass, check_score = tokenize_and_check(file_value, answer_value, method)
-
-        return check_pass, check_score
+        peak_memory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # kilobytes on Linux, bytes on macOS
+        return peak_memory / (1024 * 1024) if sys.platform == 'darwin' else peak_memory / 1024
 
     def validate_pixels_hidden(self, data_check, file_index, file_row, error_dict, error_iter, missing=False):
 
@@ -764,8 +981,7 @@ class curation_validator(object):
             # CORRECTION: Text is not always white on dark background, it can be black on light background.            
             # This will only work if I note the original intensity of the region and dark/light or light/dark.
             # Not worth pursuing at this time. Moving on to OCR.
-            pixel_data = pydicom.dcmread(file_path).pixel_array            
-            pixel_region = pixel_data[bounding_box[1]:bounding_box[3], bounding_box[0]:bounding_box[2]]
+            pixel_region = region_reader(file_path).get_region(bounding_box, self.ocr_frame)
             
             # plt.figure(figsize=(5, 5))
             # plt.imshow(pixel_region, cmap='gray')  # Use 'gray' colormap for better visualization of grayscale images
@@ -774,7 +990,7 @@ class curation_validator(object):
             # plt.show()
 
             # Normalize pixel values to 0-255
-            if pixel_data.dtype == np.uint16:
+            if pixel_region.dtype == np.uint16:
                 scaled_region = (255 * (pixel_region / np.max(pixel_region))).astype(np.uint8)
             else:
                 scaled_region = pixel_region.astype(np.uint8)
@@ -783,7 +999,74 @@ class curation_validator(object):
             
             a='a'
             
-        def get_ocr_text(file_path, bounding_box):
+        # ---------------------------------
+        if missing:
+
+            for check_index, check_row in data_check:
+
+                file_value = "<MISSING FILE>"
+                check_pass = True
+                check_score = 1
+                
+                error_iter, error_dict = self.log_error(error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, check_pass, check_score, missing)
+
+            return error_iter, error_dict
+
+        def log_check_error(check_row):
+
+            error = traceback.format_exc()
+            logging.error(f'action: pixels_hidden | file_path: {file_row.file_path} | instance: {file_row.instance} | tag: {check_row.tag_ds} \n{error}')
+
+        # parse every region first: (check_index, check_row, check_value, bounding_box)
+        region_checks = []
+
+        for check_index, check_row in data_check:
+            try:
+                action_dict = json.loads(check_row.action_text.strip('<>'))
+                check_value = action_dict['text'].replace('\n',' ').replace('DOB:','')
+                check_value = re.sub(r'\[[A-Za-z]\]', '', check_value)
+           
+                #(start_x, start_y, end_x, end_y)
+                bounding_box = (int(action_dict['top_left'][0]), int(action_dict['top_left'][1]), 
+                                int(action_dict['bottom_right'][0]), int(action_dict['bottom_right'][1]))                
+
+                region_checks.append((check_index, check_row, check_value, bounding_box))
+            except:
+                log_check_error(check_row)
+
+        if not region_checks:
+            return error_iter, error_dict
+
+        # everything the OCR needs for this file, plain values so it can be handed to an OCR worker
+        ocr_job = {'file_index': file_index,
+                   'file_path': file_row.file_path,
+                   'file_digest': file_row.file_digest,
+                   'instance': file_row.instance,
+                   'checks': [(check_row.check_id, check_value, bounding_box, check_row.tag_ds) for check_index, check_row, check_value, bounding_box in region_checks]}
+
+        if self.defer_ocr:
+            # the OCR stage fills in these rows later, by check
+            self.ocr_jobs.append(ocr_job)
+            for check_index, check_row, check_value, bounding_box in region_checks:
+                error_iter, error_dict = self.log_error(error_dict, error_iter, file_index, file_row, check_index, check_row, None, None, None, ocr_status='pending')
+            return error_iter, error_dict
+
+        ocr_results = self.run_ocr_job(ocr_job)
+
+        for check_index, check_row, check_value, bounding_box in region_checks:
+            if check_row.check_id in ocr_results:
+                file_value, check_pass, check_score, ocr_status = ocr_results[check_row.check_id]
+                error_iter, error_dict = self.log_error(error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, check_pass, check_score, ocr_status=ocr_status)
+
+        return error_iter, error_dict
+
+    def run_ocr_job(self, ocr_job):
+        """Read the burned in text of one file's regions and validate it.
+
+        Returns {check_id: (file_value, check_pass, check_score, ocr_status)}, checks that failed are logged and left out.
+        """
+
+        def get_ocr_region(pixel_region):
 
             # Check bounding box for text using OCR
             # -----------------------------------
@@ -792,69 +1075,223 @@ class curation_validator(object):
             # EasyOCR seems pretty reliable for our basic needs.
             # It is also fast since we restrict to the bounding box.
 
-            pixel_data = pydicom.dcmread(file_path).pixel_array            
-            pixel_region = pixel_data[bounding_box[1]:bounding_box[3], bounding_box[0]:bounding_box[2]]
-            
-            if pixel_data.dtype == np.uint16:
+            if pixel_region.dtype == np.uint16:
                 scaled_region = (255 * (pixel_region / np.max(pixel_region))).astype(np.uint8)
             else:
                 scaled_region = pixel_region.astype(np.uint8)
-                
-            reader = easyocr.Reader(['en'], verbose=False)
-            results = reader.readtext(scaled_region)
 
-            ocr_text = ' '.join([text[1] for text in results])
+            return scaled_region
 
-            return scaled_region, ocr_text
-                        
-        # ---------------------------------
-        for check_index, check_row in data_check.iterrows():
+        def log_check_error(tag_ds, error=None):
 
-            if missing:
-                
-                file_value = "<MISSING FILE>"
-                check_pass = True
-                check_score = 1
-                
-                error_iter, error_dict = self.log_error(error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, check_pass, check_score, missing)
-            else:
+            # error is the traceback of a failure shared by several checks, otherwise the current one
+            error = error if error is not None else traceback.format_exc()
+            logging.error(f'action: pixels_hidden | file_path: {ocr_job["file_path"]} | instance: {ocr_job["instance"]} | tag: {tag_ds} \n{error}')
 
-                file_value = None
-                check_pass = None
-                check_score = None
+        file_path = ocr_job['file_path'].strip('<>')
 
-                try:                    
-                    file_path = file_row.file_path.strip('<>')
+        # identical pixel data has identical region texts, across files and runs
+        file_digest = ocr_job['file_digest']
+        pixel_digest = file_digest.strip('<>') if isinstance(file_digest, str) else ''
+        cache = self.get_ocr_cache() if pixel_digest not in ['', 'None', 'nan'] else None
 
-                    action_dict = json.loads(check_row.action_text.strip('<>'))
-                    check_value = action_dict['text'].replace('\n',' ').replace('DOB:','')
-                    check_value = re.sub(r'\[[A-Za-z]\]', '', check_value)
-               
-                    #(start_x, start_y, end_x, end_y)
-                    bounding_box = (int(action_dict['top_left'][0]), int(action_dict['top_left'][1]), 
-                                    int(action_dict['bottom_right'][0]), int(action_dict['bottom_right'][1]))                
+        bounding_boxes = list(dict.fromkeys(bounding_box for check_id, check_value, bounding_box, tag_ds in ocr_job['checks']))
 
-                    file_image, file_value = get_ocr_text(file_path, bounding_box)
-                
-                    if file_value:
-                        check_pass, check_score = self.validate_text(file_value, check_value, 'remove')
-                    else:
-                        check_pass = True
-                        check_score = 1                    
-
-                    # plt.figure(figsize=(8, 8))
-                    # plt.imshow(file_image, cmap='gray')
-                    # plt.title("Pixel Validation Region")
-                    # plt.axis('off')
-                    # plt.figtext(0.5, 0.01, f"OCR Text: {file_value}\n\nAction Text: {check_value}\n\nPass: {'yes' if check_pass else 'no'}  |  Score: {check_score:.2f}\n\n", ha='center', fontsize=10, bbox={"facecolor":"orange", "alpha":0.5, "pad":5})
-                    # plt.show()
-                
-                    error_iter, error_dict = self.log_error(error_dict, error_iter, file_index, file_row, check_index, check_row, file_value, check_pass, check_score)
+        # region texts already in the OCR cache, the rest is read below
+        region_texts = {}
+        region_errors = {}
+        ocr_regions = {}
+        # how each region text was found, written with the results: ocr, blank (pre-screened) or cached
+        region_status = {}
+        if cache is not None:
+            cache_keys = {bounding_box: cache.get_key(pixel_digest, self.ocr_frame, bounding_box, self.ocr_engine) for bounding_box in bounding_boxes}
+            cached = cache.lookup(cache_keys.values())
+            region_texts = {bounding_box: cached[cache_key] for bounding_box, cache_key in cache_keys.items() if cache_key in cached}
+            region_status = {bounding_box: 'cached' for bounding_box in region_texts}
+
+        read_boxes = [bounding_box for bounding_box in bounding_boxes if bounding_box not in region_texts]
 
+        if read_boxes:
+            # only the regions are read from native pixel data, anything else is decoded once for all regions of the file
+            try:
+                pixel_reader = region_reader(file_path)
+            except:
+                pixel_reader = None
+                read_error = traceback.format_exc()
+
+            # one OCR per distinct region, checks of the same bounding box share its text (or error)
+            for bounding_box in read_boxes:
+                if pixel_reader is None:
+                    region_errors[bounding_box] = read_error
+                    continue
+                try:
+                    ocr_regions[bounding_box] = get_ocr_region(pixel_reader.get_region(bounding_box, self.ocr_frame))
                 except:
-                    error = traceback.format_exc()
-                    logging.error(f'action: pixels_hidden | file_path: {file_row.file_path} | instance: {file_row.instance} | tag: {check_row.tag_ds} \n{error}')
+                    region_errors[bounding_box] = traceback.format_exc()
 
-        return error_iter, error_dict
+            if pixel_reader is not None:
+                pixel_reader.close()
+
+            # regions that cannot hold text get the empty OCR text without running OCR
+            ocr_results = {}
+            for bounding_box, ocr_region in ocr_regions.items():
+                if self.is_blank_region(ocr_region):
+                    ocr_results[bounding_box] = ''
+                    region_status[bounding_box] = 'blank'
+
+            ocr_boxes = [bounding_box for bounding_box in ocr_regions if bounding_box not in ocr_results]
+            ocr_texts, ocr_errors = self.get_ocr_texts([ocr_regions[bounding_box] for bounding_box in ocr_boxes])
+
+            for bounding_box, ocr_text, ocr_error in zip(ocr_boxes, ocr_texts, ocr_errors):
+                if ocr_error is not None:
+                    region_errors[bounding_box] = ocr_error
+                else:
+                    ocr_results[bounding_box] = ocr_text
+                    region_status[bounding_box] = 'ocr'
+            region_texts.update(ocr_results)
+
+            # only OCR output is cached, blank regions are screened again on every run:
+            # they keep their blank status and follow changes to the blank thresholds
+            if cache is not None:
+                cache.store({cache_keys[bounding_box]: ocr_text for bounding_box, ocr_text in ocr_results.items() if region_status[bounding_box] == 'ocr'})
+
+        for status in region_status.values():
+            self.region_counts[status] += 1
+
+        check_results = {}
+
+        for check_id, check_value, bounding_box, tag_ds in ocr_job['checks']:
+
+            if bounding_box in region_errors:
+                log_check_error(tag_ds, region_errors[bounding_box])
+                continue
+
+            file_image = ocr_regions.get(bounding_box)
+            file_value = region_texts[bounding_box]
+
+            check_pass = None
+            check_score = None
+
+            try:
+                if file_value:
+                    check_pass, check_score = self.validate_text(file_value, check_value, 'remove')
+                else:
+                    check_pass = True
+                    check_score = 1                    
+
+                # plt.figure(figsize=(8, 8))
+                # plt.imshow(file_image, cmap='gray')
+                # plt.title("Pixel Validation Region")
+                # plt.axis('off')
+                # plt.figtext(0.5, 0.01, f"OCR Text: {file_value}\n\nAction Text: {check_value}\n\nPass: {'yes' if check_pass else 'no'}  |  Score: {check_score:.2f}\n\n", ha='center', fontsize=10, bbox={"facecolor":"orange", "alpha":0.5, "pad":5})
+                # plt.show()
+
+                check_results[check_id] = (file_value, check_pass, check_score, region_status[bounding_box])
+
+            except:
+                log_check_error(tag_ds)
+
+        return check_results
+
+    def is_blank_region(self, image):
+
+        # Flat regions (black boxed, blanked or empty background) have next to no intensity
+        # spread and no strokes. Empty crops are left to OCR, which reports them as before.
+        if image.size == 0:
+            return False
+
+        region = image.astype(np.int16)
+
+        if np.std(region) > self.blank_std_threshold:
+            return False
+
+        # horizontal and vertical steps, colour channels (last axis of RGB regions) are not compared
+        edge_pixels = np.count_nonzero(np.abs(np.diff(region, axis=0)) > self.blank_edge_step)
+        if region.ndim > 1:
+            edge_pixels += np.count_nonzero(np.abs(np.diff(region, axis=1)) > self.blank_edge_step)
+
+        return edge_pixels <= self.blank_edge_pixels
+
+    def get_ocr_cache(self):
+
+        if self.ocr_cache is None and self.ocr_cache_file:
+            self.ocr_cache = ocr_cache(self.ocr_cache_file)
+
+        return self.ocr_cache
+
+    def get_ocr_stats(self):
+        """Return the (cached, blank, ocr) region counts for the regions validated so far."""
+
+        return (self.region_counts['cached'], self.region_counts['blank'], self.region_counts['ocr'])
+
+    def close(self):
+
+        if self.ocr_cache is not None:
+            self.ocr_cache.close()
+            self.ocr_cache = None
+
+    def get_ocr_texts(self, images):
+        """OCR the regions of one file, returning (ocr_texts, ocr_errors) with the text or the traceback of each image."""
+
+        ocr_texts = [None] * len(images)
+        ocr_errors = [None] * len(images)
+
+        if not images:
+            return ocr_texts, ocr_errors
+
+        reader = self.get_ocr_reader()
+
+        # readtext_batched needs images of one size, otherwise it resizes them and changes the results,
+        # so regions are batched by shape and single regions go through readtext as before
+        shape_groups = {}
+        for i, image in enumerate(images):
+            shape_groups.setdefault(image.shape, []).append(i)
+
+        for group in shape_groups.values():
+            if len(group) > 1:
+                try:
+                    batch_results = reader.readtext_batched([images[i] for i in group])
+                    for i, results in zip(group, batch_results):
+                        ocr_texts[i] = ' '.join([text[1] for text in results])
+                    continue
+                except:
+                    logging.info(f'OCR Batch Failed, Reading {len(group)} Regions One At A Time')
+
+            for i in group:
+                try:
+                    results = reader.readtext(images[i])
+                    ocr_texts[i] = ' '.join([text[1] for text in results])
+                except:
+                    ocr_errors[i] = traceback.format_exc()
+
+        return ocr_texts, ocr_errors
+
+
+class result_buffer(object):
+
+    # Validation results of a batch, one list per column, turned into a DataFrame once.
+
+    columns = ['file_index', 'check_index', 'check_id', 'check_passed', 'check_score', 'action', 'action_text',
+               'file_value', 'answer_value', 'tag', 'tag_ds', 'tag_name', 'modality', 'class', 'patient',
+               'study', 'series', 'instance', 'file_name', 'file_path', 'ocr_status']
+
+    def __init__(self):
+
+        self.values = [[] for column in self.columns]
+
+    def append(self, *row):
+
+        for values, value in zip(self.values, row):
+            values.append(value)
+
+    def __len__(self):
+
+        return len(self.values[0])
+
+    def get_data_frame(self):
 
+        if not len(self):
+            # no columns either, so empty batches do not change column types in pd.concat
+            return pd.DataFrame()
 
+        return pd.DataFrame(dict(zip(self.columns, self.values)), columns=self.columns)
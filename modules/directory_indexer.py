@@ -8,40 +8,138 @@ This module is used to index directories
 
 import os
 from pydicom import dcmread, errors
+from pydicom.dataelem import RawDataElement
 import pandas as pd
 import logging
-from glob import glob
 import concurrent.futures as futures
 from tqdm import tqdm
 import warnings
 import hashlib
-import math
+import struct
+
+from modules.file_indexer import file_indexer
 
 class directory_indexer(object):
 
-    def get_directory_listing(self, path, multiproc, multiproc_cpus):
+    # elements larger than this are left on disk when streaming pixel data
+    defer_size = 1024 * 1024
+    # bytes read at a time when hashing pixel data from disk
+    hash_chunk_size = 1024 * 1024
+
+    def __init__(self, allow_no_preamble=False, stream_pixel_data=True, tag_paths=None, value_paths=None):
+
+        # Accept files without the 128 byte preamble and 'DICM' prefix,
+        # as long as they start with a plausible group 0002/0008 element.
+        self.allow_no_preamble = allow_no_preamble
+
+        # Read the header only and hash Pixel Data straight from the file
+        # in chunks, instead of loading it into memory.
+        self.stream_pixel_data = stream_pixel_data
+
+        # Only flatten these tag paths (see file_indexer), None flattens every tag.
+        self.tag_paths = sorted(tag_paths) if tag_paths is not None else None
+
+        # Tag paths whose binary values are flattened as text (see file_indexer).
+        self.value_paths = sorted(value_paths) if value_paths is not None else None
+
+    def get_index_signature(self):
+        """Options that change the indexing output, used to invalidate the index cache.
+
+        The answer key dependent options are not part of it: files are cached per tag path set
+        (get_paths_version), and value_paths are applied when cached files are read.
+        """
+        return f'allow_no_preamble={self.allow_no_preamble}|binary_threshold={file_indexer.binary_threshold}'
+
+    def get_paths_version(self):
+        """Name the set of tag paths flattened, 'all' or the digest of the selected tag paths."""
+
+        if self.tag_paths is None:
+            return 'all'
+        return hashlib.md5('\n'.join(self.tag_paths).encode()).hexdigest()
+
+    # files per indexing task, and indexing tasks queued per worker
+    batch_size = 50
+    batches_per_worker = 4
+
+    def get_directory_listing(self, path, multiproc, multiproc_cpus, tags, cache=None):
+
+        # Files are indexed while the directory tree is still being walked.
+        # Only a bounded number of batches are in flight at any time, so
+        # memory stays flat and parsing overlaps with enumeration.
+        # The flattened tags of each batch go straight to the tag store (tags),
+        # only the directory rows are kept here.
 
-        files = self.get_directory_files(path)
-        batch_size = max(1, min(50, math.ceil(len(files) / multiproc_cpus))) # min 1, max 250 files in a batch
-        #batch_size = len(dir_files) // (multiproc_cpus * 5) + (1 if len(dir_files) % multiproc_cpus > 0 else 0)
-        batches = [files[i:i + batch_size] for i in range(0, len(files), batch_size)]
-        
         file_dicts = []
+        file_stats = {}
+        file_order = {}
+        skipped = {}
+
+        progress_bar = tqdm(desc="Indexing Files", unit=" files")
+
+        def get_index_batches():
+
+            for batch in self.get_directory_batches(path, self.batch_size):
+
+                for file_path in batch:
+                    file_order[file_path] = len(file_order)
+
+                if cache is not None:
+                    # Reuse unchanged files from the index cache, only index new or modified files
+                    cached_dicts, cached_tags, misses = cache.lookup(batch, self.value_paths)
+                    file_dicts.extend(cached_dicts)
+                    tags.store(cached_tags)
+                    file_stats.update(misses)
+                    progress_bar.update(len(batch) - len(misses))
+                    batch = list(misses.keys())
+
+                if batch:
+                    yield batch
+
+        def collect_batch(batch, result, result_tags, result_skipped):
+
+            file_dicts.extend(result)
+            tags.store(result_tags)
+            for reason, count in result_skipped.items():
+                skipped[reason] = skipped.get(reason, 0) + count
+            if cache is not None:
+                cache.store(result, result_tags, file_stats)
+            progress_bar.update(len(batch))
         
         if multiproc:
             workers = max(1, min(multiproc_cpus, os.cpu_count(), 60))
+            max_in_flight = workers * self.batches_per_worker
+
             with futures.ProcessPoolExecutor(max_workers=workers) as executor:
-                
-                futures_list = [executor.submit(self.index_files, batch) for batch in batches]
-                
-                for future in tqdm(futures.as_completed(futures_list), total=len(futures_list), desc="Indexing File Batches"):
-                    result = future.result()
-                    file_dicts.extend(result)
+
+                pending = {}
+
+                for batch in get_index_batches():
+
+                    pending[executor.submit(self.index_files, batch)] = batch
+
+                    if len(pending) >= max_in_flight:
+                        done, _ = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+                        for future in done:
+                            collect_batch(pending.pop(future), *future.result())
+
+                for future in futures.as_completed(list(pending)):
+                    collect_batch(pending.pop(future), *future.result())
                     
         else:
-            for batch in tqdm(batches, desc="Indexing File Batches"):
-                result = self.index_files(batch)
-                file_dicts.extend(result)            
+            for batch in get_index_batches():
+                collect_batch(batch, *self.index_files(batch))
+
+        progress_bar.close()
+
+        if cache is not None:
+            cache.prune(path)
+
+        if skipped:
+            skipped_text = ', '.join(f'{reason}: {count}' for reason, count in sorted(skipped.items()))
+            logging.info(f'Skipped {sum(skipped.values())} Non-DICOM Files ({skipped_text})')
+
+        # keep directory order regardless of which files came from the cache
+        file_dicts.sort(key=lambda file_dict: file_order[file_dict['file_path']])
 
         dir_df = pd.DataFrame(file_dicts)
         
@@ -50,9 +148,41 @@ class directory_indexer(object):
         return dir_df
 
     def get_directory_files(self, path):
-        """List all files in the given directory."""
-        all_paths = glob(os.path.join(path, '**', '*'), recursive=True)
-        return [p for p in all_paths if os.path.isfile(p)]
+        """Walk the given directory with os.scandir, yielding file paths as they are found."""
+        dir_stack = [path]
+
+        while dir_stack:
+            dir_path = dir_stack.pop()
+
+            try:
+                with os.scandir(dir_path) as entries:
+                    sub_dirs = []
+                    for entry in sorted(entries, key=lambda entry: entry.name):
+                        # skip hidden files and folders
+                        if entry.name.startswith('.'):
+                            continue
+                        if entry.is_dir():
+                            sub_dirs.append(entry.path)
+                        elif entry.is_file():
+                            yield entry.path
+            except OSError as e:
+                logging.error(f"Error reading {dir_path}: {e}")
+                continue
+
+            dir_stack.extend(reversed(sub_dirs))
+
+    def get_directory_batches(self, path, batch_size):
+        """Group walked file paths into batches of at most batch_size."""
+        batch = []
+
+        for file_path in self.get_directory_files(path):
+            batch.append(file_path)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+        if batch:
+            yield batch
 
     def md5sum_data(self, data):
         """Calculate the md5sum of data, return (size, digest)"""
@@ -66,9 +196,98 @@ class directory_indexer(object):
     
         return data_size, data_digest
 
+    def md5sum_element(self, dcm, element):
+        """Calculate the md5sum of a deferred element by streaming it from the open file, return (size, digest)
+
+        The digest matches md5sum_data on the value pydicom would have loaded.
+        For encapsulated (undefined length) values, that is every item up to
+        the sequence delimiter, item tags and lengths included.
+        """
+        if element.length == 0xFFFFFFFF:
+            data_size = self.get_encapsulated_length(dcm, element)
+            if data_size is None:
+                return None
+        else:
+            data_size = element.length
+
+        data_hash = hashlib.md5()
+        dcm.seek(element.value_tell)
+        remaining = data_size
+        while remaining > 0:
+            chunk = dcm.read(min(self.hash_chunk_size, remaining))
+            if not chunk:
+                return None
+            data_hash.update(chunk)
+            remaining -= len(chunk)
+
+        return data_size, data_hash.hexdigest()
+
+    def get_encapsulated_length(self, dcm, element):
+        """Walk the items of an encapsulated value and return its length up to the sequence delimiter."""
+        endian = '<' if element.is_little_endian else '>'
+        item_tag = struct.pack(f'{endian}HH', 0xFFFE, 0xE000)
+        delimiter_tag = struct.pack(f'{endian}HH', 0xFFFE, 0xE0DD)
+        file_size = os.fstat(dcm.fileno()).st_size
+
+        dcm.seek(element.value_tell)
+        while True:
+            tag_bytes = dcm.read(4)
+            if tag_bytes == delimiter_tag:
+                return dcm.tell() - 4 - element.value_tell
+            if tag_bytes != item_tag:
+                return None
+            length_bytes = dcm.read(4)
+            if len(length_bytes) < 4:
+                return None
+            item_length = struct.unpack(f'{endian}L', length_bytes)[0]
+            if dcm.tell() + item_length > file_size:
+                return None
+            dcm.seek(item_length, os.SEEK_CUR)
+
+    def sniff_file(self, dcm):
+        """Check the start of an open file for a DICOM header with a single small read.
+
+        Returns (is_dicom, force, reason), where force is True for files
+        that have no preamble and need to be read with dcmread(force=True).
+        """
+
+        header = dcm.read(132)
+
+        if len(header) == 132 and header[128:132] == b'DICM':
+            return True, False, None
+
+        if not self.allow_no_preamble:
+            return False, False, 'no_dicm_prefix' if len(header) == 132 else 'too_small'
+
+        # No preamble: the file should start directly with a
+        # (0002,xxxx) meta or (0008,xxxx) element, in either explicit or implicit VR
+        if len(header) < 8:
+            return False, False, 'too_small'
+
+        group, element = struct.unpack('<HH', header[0:4])
+        if group not in (0x0002, 0x0008):
+            return False, False, 'no_preamble_unknown_start'
+
+        # two uppercase letters is an explicit VR, otherwise bytes 4-8 are an implicit VR length
+        explicit_vr = header[4:6]
+        if not (explicit_vr.isalpha() and explicit_vr.isupper()):
+            length = struct.unpack('<L', header[4:8])[0]
+            if length > os.fstat(dcm.fileno()).st_size:
+                return False, False, 'no_preamble_unknown_start'
+
+        return True, True, None
+
     def index_files(self, file_paths):
+
+        # Each file is parsed once. Along with the directory row, the flattened
+        # tags are returned (keyed by file_path) so the file_organizer does not
+        # need to re-read the file from disk.
         
         file_dicts = []
+        tag_dicts = {}
+        skipped = {}
+
+        indexer = file_indexer(self.tag_paths, self.value_paths)
         
         for file_path in file_paths:
 
@@ -79,14 +298,31 @@ class directory_indexer(object):
                     warnings.filterwarnings("ignore", message="Unknown encoding")
                     
                     with open(file_path, 'rb') as dcm:
+
+                        is_dicom, force, reason = self.sniff_file(dcm)
+                        if not is_dicom:
+                            logging.debug(f'Skipping {file_path}: {reason}')
+                            skipped[reason] = skipped.get(reason, 0) + 1
+                            continue
+
+                        dcm.seek(0)
                         try:
-                            dataset = dcmread(dcm, force=False)
+                            dataset = dcmread(dcm, force=force, defer_size=self.defer_size if self.stream_pixel_data else None)
                         except errors.InvalidDicomError:
+                            logging.debug(f'Skipping {file_path}: invalid_dicom')
+                            skipped['invalid_dicom'] = skipped.get('invalid_dicom', 0) + 1
                             continue
                         
                         pixel_digest = None
                         if 'PixelData' in dataset:
-                            pixel_size, pixel_digest = self.md5sum_data(dataset.PixelData)
+                            pixel_element = indexer.get_raw_element(dataset, 'PixelData')
+                            pixel_hash = None
+                            if isinstance(pixel_element, RawDataElement) and pixel_element.value is None:
+                                pixel_hash = self.md5sum_element(dcm, pixel_element)
+                            if pixel_hash is None:
+                                # not deferred, or not streamable: hash the loaded value
+                                pixel_hash = self.md5sum_data(dataset.PixelData)
+                            pixel_size, pixel_digest = pixel_hash
                         
                         file_dict = {
                             'class': getattr(dataset, 'SOPClassUID', None),
@@ -98,14 +334,19 @@ class directory_indexer(object):
                             'instance_num': getattr(dataset, 'InstanceNumber', None),
                             'file_name': os.path.basename(file_path),
                             'file_path': file_path,
-                            'file_digest': pixel_digest
+                            'file_digest': pixel_digest,
+                            'file_size': os.fstat(dcm.fileno()).st_size
                         }
+
+                        tag_dict = indexer.index_dataset(dataset, lambda element: self.md5sum_element(dcm, element))
+
                 file_dicts.append(file_dict)
+                tag_dicts[file_path] = tag_dict
                 
             except Exception as e:
                 logging.error(f"Error reading {file_path}: {e}")
 
-        return file_dicts
+        return file_dicts, tag_dicts, skipped
 
 
 
@@ -6,49 +6,51 @@ This module is used to index files
 
 """
 
-import os
-from pydicom import dcmread
-import pandas as pd
-import numpy as np
+import sys
 import logging
-import warnings
-
-import concurrent.futures as futures
+import hashlib
+from pydicom.dataelem import RawDataElement
+from pydicom.datadict import dictionary_VR, private_dictionary_VR
+from pydicom.tag import Tag
 
 class file_indexer(object):
 
-    #def __init__(self):
-
-    def get_file_table(self, file_data, multiproc, multiproc_cpus, log_path, log_level):
+    # Bulk binary values longer than this are indexed as length + md5
+    # instead of the text of the bytes.
+    binary_threshold = 1024
+    binary_vrs = ['OB', 'OD', 'OF', 'OL', 'OV', 'OW', 'UN']
+    binary_prefix = '<BINARY length='
 
-        dcm_dicts = []
+    def __init__(self, tag_paths=None, value_paths=None):
 
-        cpu_count = os.cpu_count()
+        # Selective extraction: when tag_paths is given, only those tag paths are
+        # flattened, and only sequences on the way to one of them are walked.
+        self.tag_paths = None
+        self.sequence_paths = None
 
-        if multiproc and len(file_data) > (multiproc_cpus * 100):
-            workers = max(1, min(multiproc_cpus, os.cpu_count(), 60))
-            
-            file_lists = np.array_split(file_data, workers)
+        if tag_paths is not None:
+            self.tag_paths = set(tag_paths)
+            self.sequence_paths = set()
+            for tag_path in self.tag_paths:
+                item_start = tag_path.find('[<')
+                while item_start != -1:
+                    self.sequence_paths.add(tag_path[:item_start])
+                    item_start = tag_path.find('[<', item_start + 1)
 
-            with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        # Tag paths checked by the answer key. Their bulk binary values are flattened
+        # as text like any other value, never as length + md5, so checks still see the value.
+        self.value_paths = set(value_paths) if value_paths is not None else set()
 
-                futures_list = []
+    def get_file_table(self, file_data, tag_data, log_path, log_level):
 
-                for file_list in file_lists:
-                    futures_list.append(executor.submit(self.index_files, file_list, log_path, log_level))
+        # Files are parsed once by the directory_indexer, which hands over the
+        # flattened tags for each file_path. No file is re-read from disk here.
+        file_table = self.index_files(file_data, tag_data, log_path, log_level)
 
-                for future in futures.as_completed(futures_list):
-                    dcm_dicts.append(future.result())
-
-        else:
-            dcm_dicts.append(self.index_files(file_data, log_path, log_level))
+        return file_table
 
-        dcm_df = pd.concat((pd.DataFrame.from_dict(dcm_dict, 'index') for dcm_dict in dcm_dicts))
+    def index_files(self, list_df, tag_data, log_path, log_level):
 
-        return dcm_df
-
-    def index_files(self, list_df, log_path, log_level):
-        
         def initialize_logging(log_path, log_level):
 
             logging.basicConfig(
@@ -60,112 +62,222 @@ class file_indexer(object):
                 ]
             )
 
-        def index_file_elements(dataset, dict, depth, count, label):
+        initialize_logging(log_path, log_level)
 
-            #recursively iterate all items in dataset
+        file_table = []
 
-            ignore_value = ['Pixel Data', 'Overlay Data', 'File Meta Information Version']
+        for row in list_df.to_dict('records'):
 
-            tag_dict = dict
+            #logging.debug(f'Indexing {row["file_path"]}')
 
-            for tag in dataset:
-            
-                tag_path = ''
+            file_table.append(file_record(
+                file_name=f'<{row["file_name"]}>',
+                file_path=f'<{row["file_path"]}>',
+                file_digest=f'<{row["file_digest"]}>',
+                modality=f'<{row["modality"]}>',
+                sop_class=f'<{row["class"]}>',
+                patient=f'<{row["patient"]}>',
+                study=f'<{row["study"]}>',
+                series=f'<{row["series"]}>',
+                instance=f'<{row["instance"]}>',
+                tags=self.intern_tags(tag_data.get(row['file_path'], {}))
+            ))
 
-                if tag.is_private:
-                    tag_label = str(tag.tag).strip().replace(r', ',r',')
+        return file_table
 
-                    part_01 = tag_label[1:5]
-                    part_02 = tag_label[6:8]
-                    part_03 = tag_label[8:10]
+    def intern_tags(self, tag_dict):
 
-                    value = ''
+        # Tag paths repeat across every file, share one string object per path
+        return {sys.intern(tag_path): value for tag_path, value in tag_dict.items()}
 
-                    if tag.private_creator:
-                        private_creator = str(tag.private_creator).upper()
-                        tag_label = f'({part_01},"{private_creator}",{part_03})'
-                    else:
-                        tag_label = str(tag.tag).strip().replace(r', ',r',')
+    def index_dataset(self, dataset, hash_deferred=None):
 
-                else:
-                    private_creator = ''
+        # flatten a parsed dataset into {<tag_path>: <value>}
+        # hash_deferred(raw_element) returns (size, digest) for a value left on disk
+        return self.index_file_elements(dataset, {}, 0, 0, None, hash_deferred)
 
-                    tag_label = str(tag.tag).strip().replace(r', ',r',')
+    def get_tag_path(self, dataset, tag_key, depth, count, label):
 
-                #---------------------------------
+        tag = Tag(tag_key)
 
-                if count:
-                    append = f'[<{str(count).zfill(4)}>]'
-                else:
-                    append = f'[<0000>]'
+        tag_label = str(tag).strip().replace(r', ',r',')
 
-                #---------------------------------
+        if tag.is_private:
+            # same private creator lookup pydicom does, without converting the element
+            private_creator_tag = Tag(tag.group, tag.element >> 8)
 
-                if depth == 0:
-                    tag_path = f'<{tag_label}>'
-                else:
-                    tag_path = f'{label}{append}<{tag_label}>'
+            if private_creator_tag != tag and private_creator_tag in dataset:
+                private_creator = dataset[private_creator_tag].value
+            else:
+                private_creator = None
+
+            if private_creator:
+                part_01 = tag_label[1:5]
+                part_03 = tag_label[8:10]
+
+                private_creator = str(private_creator).upper()
+                tag_label = f'({part_01},"{private_creator}",{part_03})'
+
+        #---------------------------------
+
+        if count:
+            append = f'[<{str(count).zfill(4)}>]'
+        else:
+            append = f'[<0000>]'
+
+        #---------------------------------
+
+        if depth == 0:
+            tag_path = f'<{tag_label}>'
+        else:
+            tag_path = f'{label}{append}<{tag_label}>'
+
+        return tag_path
+
+    def index_file_elements(self, dataset, dict, depth, count, label, hash_deferred=None):
+
+        #recursively iterate all items in dataset
+
+        ignore_value = ['Pixel Data', 'Overlay Data', 'File Meta Information Version']
+
+        tag_dict = dict
+
+        for tag_key in sorted(dataset.keys()):
+
+            tag_path = self.get_tag_path(dataset, tag_key, depth, count, label)
 
-                #---------------------------------
+            keep_value = self.tag_paths is None or tag_path in self.tag_paths
+            keep_sequence = self.sequence_paths is None or tag_path in self.sequence_paths
 
-                #if tag_path in ['<(0018,115e)>','<(0018,1702)>','<(0018,1706)>','<(0018,7032)>','<(0028,0103)>','<(0028,1052)>','<(0040,0302)>']:
-                #    a='a'
+            if not keep_value and not keep_sequence:
+                # not referenced by the answer key, never converted or stringified
+                continue
 
-                #if tag_path in ['<(0019,"SIEMENS CT VA0  COAD",92)>','<(0021,"SIEMENS MED",11)>']:
-                #    a='a'
+            raw_tag = self.get_raw_element(dataset, tag_key)
 
+            is_deferred = isinstance(raw_tag, RawDataElement) and raw_tag.value is None and raw_tag.length != 0
+
+            if is_deferred and self.is_pixel_tag(tag_key):
+                # Pixel/Overlay Data left on disk by deferred reading is never loaded,
+                # it is reported the same as when loaded: as removed.
+                tag_dict[tag_path] = f'<REMOVED>'
+                continue
+
+            keep_text = tag_path in self.value_paths
+
+            if keep_value and not keep_text and is_deferred and hash_deferred is not None and self.get_raw_vr(dataset, raw_tag) in self.binary_vrs:
+                # large binary value left on disk, hashed without loading it
+                hashed = hash_deferred(raw_tag)
+                if hashed is not None:
+                    tag_dict[tag_path] = f'{self.binary_prefix}{hashed[0]} md5={hashed[1]}>'
+                    continue
+
+            tag = dataset[tag_key]
+
+            #---------------------------------
+
+            #if tag_path in ['<(0018,115e)>','<(0018,1702)>','<(0018,1706)>','<(0018,7032)>','<(0028,0103)>','<(0028,1052)>','<(0040,0302)>']:
+            #    a='a'
+
+            #if tag_path in ['<(0019,"SIEMENS CT VA0  COAD",92)>','<(0021,"SIEMENS MED",11)>']:
+            #    a='a'
+
+            if keep_value:
                 if tag.name in ignore_value:
                     if tag.value:
                         tag_dict[tag_path] = f'<REMOVED>'
                     else:
                         tag_dict[tag_path] = f'<REMOVED>'
+                elif self.is_bulk_binary(tag) and not keep_text:
+                    tag_dict[tag_path] = f'{self.binary_prefix}{len(tag.value)} md5={hashlib.md5(tag.value).hexdigest()}>'
                 else:
                     if tag.value is not None:
                         tag_dict[tag_path] = f'<{str(tag.value).strip()}>'
                     else:
                         tag_dict[tag_path] = f'<>'
 
-                #---------------------------------
+            #---------------------------------
 
-                #logging.debug(f'  {tag_path}')
+            #logging.debug(f'  {tag_path}')
 
-                if tag.VR == 'SQ':   # a sequence
-                
-                    for i, seq_tag in enumerate(tag.value):
-                    
-                        tag_dict = index_file_elements(seq_tag, tag_dict, depth + 1, i, tag_path)
+            if tag.VR == 'SQ' and keep_sequence:   # a sequence
 
-            return tag_dict
+                for i, seq_tag in enumerate(tag.value):
 
-        initialize_logging(log_path, log_level)
+                    tag_dict = self.index_file_elements(seq_tag, tag_dict, depth + 1, i, tag_path, hash_deferred)
+
+        return tag_dict
+
+    def is_pixel_tag(self, tag_key):
+
+        # (7fe0,0010) Pixel Data and (60xx,3000) Overlay Data
+        return tag_key == 0x7FE00010 or (tag_key & 0xFF00FFFF) == 0x60003000
+
+    def is_bulk_binary(self, tag):
+
+        return tag.VR in self.binary_vrs and isinstance(tag.value, bytes) and len(tag.value) > self.binary_threshold
+
+    def get_raw_element(self, dataset, tag_key):
+
+        # Dataset.get_item reads a deferred value in before returning it,
+        # the stored element is looked up directly so the value stays on disk
+        return dataset._dict.get(Tag(tag_key))
+
+    def get_raw_vr(self, dataset, raw_tag):
+
+        # implicit VR elements are read without a VR, look it up like pydicom would
+        if raw_tag.VR is not None:
+            return raw_tag.VR
+
+        tag = Tag(raw_tag.tag)
+        try:
+            if tag.is_private:
+                private_creator_tag = Tag(tag.group, tag.element >> 8)
+                if private_creator_tag not in dataset:
+                    return 'UN'
+                return private_dictionary_VR(tag, dataset[private_creator_tag].value)
+            return dictionary_VR(tag)
+        except KeyError:
+            return 'UN'
+
+
+class file_record(object):
+
+    # One indexed file: the directory fields plus its flattened tags.
+    # Lookups by tag path are dictionary lookups on tags, and files only
+    # carry the tag paths they actually contain.
+
+    __slots__ = ('file_name', 'file_path', 'file_digest', 'modality', 'sop_class',
+                 'patient', 'study', 'series', 'instance', 'tags')
+
+    fields = {'file_name': 'file_name', 'file_path': 'file_path', 'file_digest': 'file_digest',
+              'modality': 'modality', 'class': 'sop_class', 'patient': 'patient',
+              'study': 'study', 'series': 'series', 'instance': 'instance'}
 
-        table_dict = {}
-        table_iter = 0
+    def __init__(self, file_name, file_path, file_digest, modality, sop_class, patient, study, series, instance, tags):
 
-        for index, row in list_df.iterrows():
+        self.file_name = file_name
+        self.file_path = file_path
+        self.file_digest = file_digest
+        self.modality = modality
+        self.sop_class = sop_class
+        self.patient = patient
+        self.study = study
+        self.series = series
+        self.instance = instance
+        self.tags = tags
 
-            #logging.debug(f'Indexing {row.file_path}')
+    def __contains__(self, key):
 
-            table_dict[table_iter] = {}
-            table_dict[table_iter]['file_name'] = f'<{row.file_name}>'
-            table_dict[table_iter]['file_path'] = f'<{row.file_path}>'
-            table_dict[table_iter]['file_digest'] = f'<{row.file_digest}>'
+        return key in self.fields or key in self.tags
 
-            with warnings.catch_warnings():
-                warnings.filterwarnings("ignore", message="Unknown encoding")  
-                
-                with open(row.file_path, 'rb') as dcm:
-                    dataset = dcmread(dcm, force=True)
-                
-                    table_dict[table_iter]['modality'] = f'<{dataset.Modality}>'
-                    table_dict[table_iter]['class'] = f'<{dataset.SOPClassUID}>'
-                    table_dict[table_iter]['patient'] = f'<{dataset.PatientID}>'
-                    table_dict[table_iter]['study'] = f'<{dataset.StudyInstanceUID}>'
-                    table_dict[table_iter]['series'] = f'<{dataset.SeriesInstanceUID}>'
-                    table_dict[table_iter]['instance'] = f'<{dataset.SOPInstanceUID}>'
+    def __getitem__(self, key):
 
-                    table_dict[table_iter] = index_file_elements(dataset, table_dict[table_iter], 0, 0, None)
+        field = self.fields.get(key)
+        if field is not None:
+            return getattr(self, field)
+        return self.tags[key]
 
-            table_iter += 1
+    def get(self, key, default=None):
 
-        return table_dict
\ No newline at end of file
+        return self[key] if key in self else default
@@ -8,82 +8,184 @@ This module is used to validate the curation process
 
 import os
 import pandas as pd
+import numpy as np
 import logging
 import math
+import time
+import pickle
 
 from modules.file_indexer import file_indexer
+from modules.tag_store import tag_store
 from modules.answer_preparer import answer_preparer
+from modules.answer_compiler import answer_compiler
 from modules.curation_validator import curation_validator
 
 import concurrent.futures as futures
 from tqdm import tqdm
 
+# uid/patid maps of a worker process, loaded once by file_organizer.init_worker
+worker_maps = {}
+
 class file_organizer(object):
 
-    def run_validation(self, dir_df, output_path, answer_df, uids_old_to_new, uids_new_to_old, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level):
+    # files (OCR jobs) per OCR stage task
+    ocr_task_size = 4
+
+    # Predicted seconds, used to balance series/study batches (tag stage only), to submit
+    # the most expensive batches first and to order the OCR stage.
+    # The log reports predicted vs actual times to tune them against.
+    cost_per_file = 0.005           # tag stage, per file
+    cost_per_check = 0.0005         # tag stage, per answer key check
+    cost_per_ocr_region = 0.5       # OCR stage, per pixels_hidden region
+    cost_per_ocr_mb = 0.02          # OCR stage, per MB of a file with pixels_hidden checks
+
+    def run_validation(self, dir_df, tag_store_file, output_path, answer_key_file, uids_old_to_new, uids_new_to_old, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level, shard_by='instance', engine='row', ocr_cache_file=None, ocr_cpus=None):
 
         #-------------------------------------
         # Get list of series and loop
         #-------------------------------------
         
+        # (batch number, validation df) of every batch, pixels_hidden rows pending until the OCR stage is done
         validation_dfs = []
+        # OCR stage results by (batch number, file_index, check_id)
+        ocr_results = {}
+        # regions of every OCR task: reused from the OCR cache, blank (OCR skipped) and read by OCR
+        ocr_stats = [0, 0, 0]
+        # (hits, misses) of the text match cache, then of the answer token cache
+        text_stats = [0, 0, 0, 0]
         
         file_sops = dir_df['instance'].unique()
-        old_sops = []
+        old_sops = set()
 
         batch_size = max(1, min(50, math.ceil(len(file_sops) / multiproc_cpus))) # min 1, max 250 files in a batch
         #batch_size = len(files) // (multiproc_cpus * 10) + (1 if len(files) % multiproc_cpus > 0 else 0)
-        file_batches = [file_sops[i:i + batch_size] for i in range(0, len(file_sops), batch_size)]        
+
+        # predicted tag and OCR stage seconds of every instance, from its answer key checks and file size
+        instance_costs = self.get_instance_costs(dir_df, answer_compiler(answer_key_file).get_check_counts(), uids_new_to_old)
+        file_sizes = dict(zip('<' + dir_df['file_path'].astype(str) + '>', dir_df['file_size'])) if 'file_size' in dir_df.columns else {}
+
+        if shard_by in ['series', 'study']:
+            # whole groups per batch, so batches can also be cut by their tag stage cost without changing results
+            file_batches = self.get_group_batches(dir_df, shard_by, batch_size, {instance: cost[0] for instance, cost in instance_costs.items()})
+        else:
+            # instance batches keep their place, scoped answer rows only reach files of the same batch
+            file_batches = [file_sops[i:i + batch_size] for i in range(0, len(file_sops), batch_size)]
+
+        # predicted (tag, OCR) seconds of each batch, the most expensive batches are submitted first
+        batch_costs = [tuple(map(sum, zip((0, 0), *(instance_costs.get(instance, (0, 0)) for instance in batch)))) for batch in file_batches]
+        batch_order = sorted(range(len(file_batches)), key=lambda batch_number: -sum(batch_costs[batch_number]))
         
-        logging.info(f'{len(file_batches)} File Batches to Validate')
+        logging.info(f'{len(file_batches)} File Batches to Validate (sharded by {shard_by}), Predicted {sum(cost[0] for cost in batch_costs):.1f}s Tag Checks, {sum(cost[1] for cost in batch_costs):.1f}s OCR')
+
+        # (predicted, actual) seconds of every tag batch and OCR task
+        batch_times = []
+        ocr_times = []
+
+        # dir_df rows of each instance, indexed once instead of scanning dir_df for every batch
+        instance_positions = dir_df.groupby('instance', sort=False).indices
 
         #multiproc=False
 
         if multiproc:
             workers = max(1, min(multiproc_cpus, os.cpu_count(), 60))
+            # only the OCR workers load the OCR model
+            ocr_workers = max(1, min(ocr_cpus if ocr_cpus else multiproc_cpus, os.cpu_count(), 60))
+
+            # The id maps are written once and loaded once per worker,
+            # batches only carry their own files and answer uids.
+            map_file = self.write_worker_maps(output_path, uids_old_to_new, patids_old_to_new)
             
-            with futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            # OCR stage: its own pool and queue, fed while the tag checks are still running
+            with futures.ProcessPoolExecutor(max_workers=ocr_workers) as ocr_executor:
+
+                ocr_futures = {}
+
+                try:
+                    with futures.ProcessPoolExecutor(max_workers=workers, initializer=self.init_worker, initargs=(map_file,)) as executor:
+
+                        futures_list = {}
+
+                        for batch_number in batch_order:
+                            batch = file_batches[batch_number]
+                            #lookup_uids = [uids_new_to_old[instance] for instance in batch]
+                            lookup_uids = []
+                            for instance in batch:
+                                if instance in uids_new_to_old:
+                                    lookup_uids.append(uids_new_to_old[instance])
+                                else:
+                                    logging.error(f'Instance {instance} not found in UID mapping')                      
+                            old_sops.update(lookup_uids)
+                            file_df = self.get_batch_rows(dir_df, instance_positions, batch)
+                        
+                            futures_list[executor.submit(self.run_timed, self.validation_runner, output_path, file_df, tag_store_file, answer_key_file, lookup_uids, None, None, log_path, log_level, engine)] = batch_number
+
+                        for future in tqdm(futures.as_completed(futures_list), total=len(futures_list), desc="Validating File Batches"):
+                            batch_number = futures_list[future]
+                            batch_time, (result, ocr_jobs, batch_text_stats) = future.result()
+                            text_stats = [total + count for total, count in zip(text_stats, batch_text_stats)]
+                            batch_times.append((batch_costs[batch_number][0], batch_time))
+                            if result is not None:                    
+                                validation_dfs.append((batch_number, result))
+                            for task_cost, ocr_task in self.get_ocr_tasks(batch_number, ocr_jobs, file_sizes):
+                                ocr_futures[ocr_executor.submit(self.run_timed, self.ocr_runner, ocr_task, ocr_cache_file, log_path, log_level)] = task_cost
+                finally:
+                    os.remove(map_file)
+
+                for future in tqdm(futures.as_completed(ocr_futures), total=len(ocr_futures), desc="Reading Burned In Text"):
+                    task_time, (task_results, task_ocr_stats, task_text_stats) = future.result()
+                    text_stats = [total + count for total, count in zip(text_stats, task_text_stats)]
+                    ocr_times.append((ocr_futures[future], task_time))
+                    ocr_results.update(task_results)
+                    ocr_stats = [total + count for total, count in zip(ocr_stats, task_ocr_stats)]
 
-                futures_list = []
+        else:
+            ocr_tasks = []
+
+            for batch_number in tqdm(batch_order, desc="Validating File Batches"):
+
+                batch = file_batches[batch_number]
+                lookup_uids = []
+                for instance in batch:
+                    if instance in uids_new_to_old:
+                        lookup_uids.append(uids_new_to_old[instance])
+                    else:
+                        logging.error(f'Instance {instance} not found in UID mapping')
+                old_sops.update(lookup_uids)
+                
+                file_df = self.get_batch_rows(dir_df, instance_positions, batch)
 
-                for batch in file_batches:
-                    #lookup_uids = [uids_new_to_old[instance] for instance in batch]
-                    lookup_uids = []
-                    for instance in batch:
-                        if instance in uids_new_to_old:
-                            lookup_uids.append(uids_new_to_old[instance])
-                        else:
-                            logging.error(f'Instance {instance} not found in UID mapping')                      
-                    old_sops.extend(lookup_uids)
-                    file_df = dir_df[dir_df['instance'].isin(batch)]
-                    file_answer_df = answer_df[answer_df['SOPInstanceUID'].isin(lookup_uids)]
-                    
-                    futures_list.append(executor.submit(self.validation_runner, output_path, file_df, file_answer_df, uids_old_to_new, patids_old_to_new, log_path, log_level))
+                batch_time, (result, ocr_jobs, batch_text_stats) = self.run_timed(self.validation_runner, output_path, file_df, tag_store_file, answer_key_file, lookup_uids, uids_old_to_new, patids_old_to_new, log_path, log_level, engine)
+                batch_times.append((batch_costs[batch_number][0], batch_time))
+                text_stats = [total + count for total, count in zip(text_stats, batch_text_stats)]
+                if result is not None:                
+                    validation_dfs.append((batch_number, result))
+                ocr_tasks.extend(self.get_ocr_tasks(batch_number, ocr_jobs, file_sizes))
 
-                for future in tqdm(futures.as_completed(futures_list), total=len(futures_list), desc="Validating File Batches"):
-                    result = future.result()
-                    if result is not None:                    
-                        validation_dfs.append(result)
+            # most expensive first, over all batches
+            ocr_tasks.sort(key=lambda ocr_task: -ocr_task[0])
 
-        else:
-            for batch in tqdm(file_batches, desc="Validating File Batches"):
+            for task_cost, ocr_task in tqdm(ocr_tasks, desc="Reading Burned In Text"):
+                task_time, (task_results, task_ocr_stats, task_text_stats) = self.run_timed(self.ocr_runner, ocr_task, ocr_cache_file, log_path, log_level)
+                text_stats = [total + count for total, count in zip(text_stats, task_text_stats)]
+                ocr_times.append((task_cost, task_time))
+                ocr_results.update(task_results)
+                ocr_stats = [total + count for total, count in zip(ocr_stats, task_ocr_stats)]
 
-                lookup_uids = [uids_new_to_old[instance] for instance in batch]
-                old_sops.extend(lookup_uids)
-                
-                file_df = dir_df[dir_df['instance'].isin(batch)]
-                file_answer_df = answer_df[answer_df['SOPInstanceUID'].isin(lookup_uids)]
+        logging.info(f'OCR Regions: {ocr_stats[0]} Reused From Cache, {ocr_stats[1]} Blank (OCR Skipped), {ocr_stats[2]} Read by OCR')
 
-                result = self.validation_runner(output_path, file_df, file_answer_df, uids_old_to_new, patids_old_to_new, log_path, log_level)
-                if result is not None:                
-                    validation_dfs.append(result)
+        self.log_batch_times('File Batch', batch_times)
+        self.log_batch_times('OCR Task', ocr_times)
+
+        # results in batch order, whatever order the batches ran in
+        validation_dfs.sort(key=lambda batch_result: batch_result[0])
+        validation_dfs = [self.merge_ocr_results(batch_number, validation_df, ocr_results) for batch_number, validation_df in validation_dfs]
                 
         #-------------------------------------
         # Handle Missing Files
         #-------------------------------------      
-        answer_sops = answer_df['SOPInstanceUID'].unique()  
+        answer_sops = answer_compiler(answer_key_file).get_answer_sops()
         
-        missing_sops = list(set(answer_sops) - set(old_sops))
+        missing_sops = [sop for sop in answer_sops if sop not in old_sops]
         missing_batch_size = max(1, min(50, math.ceil(len(missing_sops) / multiproc_cpus))) # min 1, max 250 files in a batch
         missing_file_batches = [missing_sops[i:i + missing_batch_size] for i in range(0, len(missing_sops), missing_batch_size)] 
 
@@ -100,12 +202,12 @@ class file_organizer(object):
                     lookup_uids = batch                    
 
                     file_df = None
-                    file_answer_df = answer_df[answer_df['SOPInstanceUID'].isin(lookup_uids)]
                     
-                    futures_list.append(executor.submit(self.validation_runner, output_path, file_df, file_answer_df, uids_old_to_new, patids_old_to_new, log_path, log_level))
+                    futures_list.append(executor.submit(self.validation_runner, output_path, file_df, None, answer_key_file, lookup_uids, None, None, log_path, log_level, engine))
 
                 for future in tqdm(futures.as_completed(futures_list), total=len(futures_list), desc="Validating Missing File Batches"):
-                    result = future.result()
+                    result, ocr_jobs, batch_text_stats = future.result()
+                    text_stats = [total + count for total, count in zip(text_stats, batch_text_stats)]
                     if result is not None:                    
                         validation_dfs.append(result)
 
@@ -115,20 +217,23 @@ class file_organizer(object):
                 lookup_uids = batch
 
                 file_df = None
-                file_answer_df = answer_df[answer_df['SOPInstanceUID'].isin(lookup_uids)]
 
-                result = self.validation_runner(output_path, file_df, file_answer_df, uids_old_to_new, patids_old_to_new, log_path, log_level)
+                result, ocr_jobs, batch_text_stats = self.validation_runner(output_path, file_df, None, answer_key_file, lookup_uids, uids_old_to_new, patids_old_to_new, log_path, log_level, engine)
+                text_stats = [total + count for total, count in zip(text_stats, batch_text_stats)]
                 if result is not None:
                     validation_dfs.append(result)
 
         #------------------------------------- 
 
+        logging.info(f'Text Match Cache: {self.get_hit_rate(text_stats[0], text_stats[1])} of {text_stats[0] + text_stats[1]} Matches Reused, '
+                     f'{self.get_hit_rate(text_stats[2], text_stats[3])} of {text_stats[2] + text_stats[3]} Answer Tokenizations Reused')
+
         full_validation_df = pd.concat(validation_df for validation_df in validation_dfs)
         #full_validation_df.to_csv(os.path.join(self.output_path, "validation_results.csv"))
 
         return full_validation_df
 
-    def validation_runner(self, output_path, data_df, answer_df, uids_old_to_new, patids_old_to_new, log_path, log_level):
+    def validation_runner(self, output_path, data_df, tag_store_file, answer_key_file, answer_uids, uids_old_to_new, patids_old_to_new, log_path, log_level, engine='row'):
 
         def initialize_logging(log_path, log_level):
 
@@ -146,30 +251,229 @@ class file_organizer(object):
         multiproc = False
         multiproc_cpus = 1
 
+        # maps not passed in are the ones loaded by init_worker
+        if uids_old_to_new is None:
+            uids_old_to_new = worker_maps.get('uids_old_to_new', {})
+        if patids_old_to_new is None:
+            patids_old_to_new = worker_maps.get('patids_old_to_new', {})
+
+        #-------------------------------------
+        # Query this batch's answer rows and checks from the compiled answer key
+        #-------------------------------------
+        answer_df, check_df = answer_compiler(answer_key_file).get_answer_data(answer_uids)
+
         if data_df is not None:
             #-------------------------------------
-            # Index files
+            # Build file table from the tags flattened during directory indexing,
+            # read from the tag store by file_path
             #-------------------------------------
+            tags = tag_store(tag_store_file).open()
+            tag_data = tags.lookup(data_df['file_path'])
+            tags.close()
+
             indexer = file_indexer()
-            file_table_df = indexer.get_file_table(data_df, multiproc, multiproc_cpus, log_path, log_level)
+            file_table_df = indexer.get_file_table(data_df, tag_data, log_path, log_level)
 
             #-------------------------------------
             # Prep Answer Data
             #-------------------------------------
             preparer = answer_preparer()
-            file_answer_df = preparer.get_prepared_data(answer_df, uids_old_to_new, multiproc, multiproc_cpus, log_path, log_level)
+            answer_df = preparer.convert_ids(answer_df, uids_old_to_new)
 
             #-------------------------------------
             # Validate Data
             #-------------------------------------
-            validator = curation_validator()
-            file_validation_df = validator.get_validation_data(file_table_df, file_answer_df, uids_old_to_new, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level)
+            # pixels_hidden checks are left pending for the OCR stage
+            validator = curation_validator(defer_ocr=True)
+            file_validation_df = validator.get_validation_data(file_table_df, answer_df, check_df, uids_old_to_new, patids_old_to_new, multiproc, multiproc_cpus, log_path, log_level, engine)
 
         else:
             # Missing Files
             # These files were in the answer key, but not in the files.
             validator = curation_validator()
-            file_validation_df = validator.get_missing_validation_data(answer_df, multiproc, multiproc_cpus, log_path, log_level)            
+            file_validation_df = validator.get_missing_validation_data(answer_df, check_df, multiproc, multiproc_cpus, log_path, log_level)            
             #file_validation_df = None
 
-        return file_validation_df
+        return file_validation_df, validator.ocr_jobs, validator.get_text_stats()
+
+    def ocr_runner(self, ocr_task, ocr_cache_file, log_path, log_level):
+
+        def initialize_logging(log_path, log_level):
+
+            logging.basicConfig(
+                level=log_level,
+                format="%(asctime)s - [%(levelname)s] - %(message)s",
+                handlers=[
+                    logging.FileHandler(log_path, 'a'),
+                    logging.StreamHandler()
+                ]
+            )
+
+        initialize_logging(log_path, log_level)
+
+        #-------------------------------------
+        # Read and validate the burned in text of each file's regions
+        #-------------------------------------
+        task_results = {}
+
+        validator = curation_validator(ocr_cache_file)
+        for batch_number, ocr_job in ocr_task:
+            for check_id, check_result in validator.run_ocr_job(ocr_job).items():
+                task_results[(batch_number, ocr_job['file_index'], check_id)] = check_result
+
+        task_ocr_stats = validator.get_ocr_stats()
+        task_text_stats = validator.get_text_stats()
+        validator.close()
+
+        return task_results, task_ocr_stats, task_text_stats
+
+    def get_ocr_tasks(self, batch_number, ocr_jobs, file_sizes):
+
+        # a few files per OCR task, so a batch full of images is spread over the OCR workers.
+        # Returns [(predicted seconds, task)], the most expensive files and tasks first.
+        job_costs = [(self.get_ocr_cost(len(set(check[2] for check in ocr_job['checks'])), file_sizes.get(ocr_job['file_path'], 0)), ocr_job) for ocr_job in ocr_jobs]
+        job_costs.sort(key=lambda job_cost: -job_cost[0])
+
+        ocr_tasks = []
+        for i in range(0, len(job_costs), self.ocr_task_size):
+            task_jobs = job_costs[i:i + self.ocr_task_size]
+            ocr_tasks.append((sum(job_cost for job_cost, ocr_job in task_jobs), [(batch_number, ocr_job) for job_cost, ocr_job in task_jobs]))
+
+        return ocr_tasks
+
+    def get_ocr_cost(self, region_count, file_size):
+
+        return self.cost_per_ocr_region * region_count + self.cost_per_ocr_mb * file_size / (1024 * 1024) if region_count else 0
+
+    def get_instance_costs(self, dir_df, check_counts, uids_new_to_old):
+
+        # predicted (tag stage, OCR stage) seconds of each instance, summed over its files
+        file_sizes = dir_df['file_size'] if 'file_size' in dir_df.columns else pd.Series(0, index=dir_df.index)
+
+        instance_costs = {}
+        for instance, file_size in zip(dir_df['instance'], file_sizes.fillna(0)):
+            check_count, pixel_count = check_counts.get(uids_new_to_old.get(instance), (0, 0))
+            tag_cost, ocr_cost = instance_costs.get(instance, (0, 0))
+            instance_costs[instance] = (tag_cost + self.cost_per_file + self.cost_per_check * check_count,
+                                        ocr_cost + self.get_ocr_cost(pixel_count, file_size))
+
+        return instance_costs
+
+    def get_hit_rate(self, hits, misses):
+
+        return f'{hits / (hits + misses):.1%}' if hits + misses else '0.0%'
+
+    def run_timed(self, runner, *args):
+
+        # (seconds, result) of runner, timed where it runs
+        start_time = time.perf_counter()
+        result = runner(*args)
+
+        return time.perf_counter() - start_time, result
+
+    def log_batch_times(self, label, batch_times):
+
+        if not batch_times:
+            return
+
+        for predicted, actual in batch_times:
+            logging.debug(f'{label}: Predicted {predicted:.2f}s, Actual {actual:.2f}s')
+
+        predicted_total = sum(predicted for predicted, actual in batch_times)
+        actual_total = sum(actual for predicted, actual in batch_times)
+        slowest = max(batch_times, key=lambda batch_time: batch_time[1])
+        logging.info(f'{label} Times: {len(batch_times)} Predicted {predicted_total:.1f}s, Actual {actual_total:.1f}s, Slowest Predicted {slowest[0]:.2f}s, Actual {slowest[1]:.2f}s')
+
+    def merge_ocr_results(self, batch_number, validation_df, ocr_results):
+
+        # fill the pending pixels_hidden rows of a batch with their OCR stage results, by check.
+        # Checks without a result failed in the OCR stage (logged there) and are dropped, as before.
+        if 'ocr_status' not in validation_df.columns:
+            return validation_df
+
+        positions = np.flatnonzero((validation_df['ocr_status'] == 'pending').to_numpy())
+        if len(positions) == 0:
+            return validation_df
+
+        check_results = [ocr_results.get((batch_number, file_index, check_id)) for file_index, check_id in
+                         zip(validation_df['file_index'].to_numpy()[positions], validation_df['check_id'].to_numpy()[positions])]
+
+        validation_df = validation_df.copy()
+        for i, column in enumerate(['file_value', 'check_passed', 'check_score', 'ocr_status']):
+            values = validation_df[column].to_numpy(dtype=object).copy()
+            values[positions] = [check_result[i] if check_result is not None else None for check_result in check_results]
+            validation_df[column] = values
+
+        failed = positions[[check_result is None for check_result in check_results]]
+
+        return validation_df.drop(index=validation_df.index[failed]).reset_index(drop=True).infer_objects()
+
+    def get_group_batches(self, dir_df, group_column, batch_size, instance_costs=None):
+
+        # Whole series (or studies) per batch, so series/study scoped answer rows
+        # are matched against every instance of their group in one place.
+        # Files without a series (or study) uid are each a group of their own, as in instance batches.
+        ungrouped_sops = [[sop] for sop in dir_df.loc[dir_df[group_column].isna(), 'instance'].unique()]
+
+        return self.pack_batches(list(dir_df.groupby(group_column, sort=False)['instance'].unique()) + ungrouped_sops, batch_size, instance_costs)
+
+    def pack_batches(self, groups, batch_size, instance_costs=None):
+
+        # Groups (lists of instances) are packed in order up to batch_size instances, a larger group is a batch of its own.
+        # With instance_costs (predicted tag stage seconds), a batch is also closed once it reaches its share of the
+        # total cost, so batches of a few expensive instances are not packed as full as cheap ones.
+        instance_costs = instance_costs or {}
+        instance_count = len(set(sop for group_sops in groups for sop in group_sops))
+        batch_count = math.ceil(instance_count / batch_size) if instance_count else 1
+        target_cost = sum(instance_costs.values()) / batch_count
+
+        file_batches = []
+        batch = []
+        batch_cost = 0
+        batched_sops = set()
+
+        for group_sops in groups:
+            group_sops = [sop for sop in group_sops if sop not in batched_sops]
+            batched_sops.update(group_sops)
+            if not group_sops:
+                continue
+
+            if batch and len(batch) + len(group_sops) > batch_size:
+                file_batches.append(batch)
+                batch = []
+                batch_cost = 0
+            batch.extend(group_sops)
+            batch_cost += sum(instance_costs.get(sop, 0) for sop in group_sops)
+
+            if target_cost and (batch_cost >= target_cost or math.isclose(batch_cost, target_cost)):
+                file_batches.append(batch)
+                batch = []
+                batch_cost = 0
+
+        if batch:
+            file_batches.append(batch)
+
+        return file_batches
+
+    def get_batch_rows(self, dir_df, instance_positions, batch):
+
+        # rows of the batch instances, in dir_df order
+        positions = [instance_positions[instance] for instance in batch if instance in instance_positions]
+        if not positions:
+            return dir_df.iloc[[]]
+
+        return dir_df.iloc[np.sort(np.concatenate(positions))]
+
+    def write_worker_maps(self, output_path, uids_old_to_new, patids_old_to_new):
+
+        # binary snapshot of the id maps, read by every worker process on start
+        map_file = os.path.join(output_path, 'worker_maps.pickle')
+        with open(map_file, 'wb') as f:
+            pickle.dump({'uids_old_to_new': uids_old_to_new, 'patids_old_to_new': patids_old_to_new}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        return map_file
+
+    def init_worker(self, map_file):
+
+        with open(map_file, 'rb') as f:
+            worker_maps.update(pickle.load(f))
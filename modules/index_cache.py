@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to cache directory indexing results between runs
+
+"""
+
+import os
+import json
+import logging
+
+from modules.cache_helper import cache_helper
+from modules.file_indexer import file_indexer
+
+class index_cache(object):
+
+    # Bump when the directory row or flattened tag format changes (see cache_helper)
+    cache_version = '3'
+
+    # file paths per IN (...) query, below the SQLite host parameter limit
+    query_chunk_size = 500
+
+    def __init__(self, cache_file, signature='', paths_version='all'):
+
+        self.cache_file = cache_file
+        self.signature = f'{self.cache_version}|{signature}'
+
+        # Tag paths flattened (see directory_indexer.get_paths_version). Files are cached once per path set,
+        # so switching between answer keys with selective indexing reuses the files of either key.
+        self.paths_version = paths_version
+
+        self.conn = cache_helper(cache_file, self.signature).open(['file_index'], 'Index Cache')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS file_index (
+                                file_path TEXT,
+                                paths_version TEXT,
+                                file_size INTEGER,
+                                file_mtime INTEGER,
+                                file_inode INTEGER,
+                                file_row TEXT,
+                                file_tags TEXT,
+                                PRIMARY KEY (file_path, paths_version))""")
+
+        # every file path looked up, files under the walked directory that are not in here are pruned
+        self.seen_paths = set()
+
+        self.hits = 0
+        self.misses = 0
+        self.pruned = 0
+
+    def get_file_stat(self, file_path):
+        """Return the (size, mtime, inode) key used to detect changed files."""
+        stat = os.stat(file_path)
+        return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+    def lookup(self, file_paths, value_paths=None):
+        """Split file_paths into cached results and files that need indexing.
+
+        Returns (file_dicts, tag_dicts, misses) where misses maps each
+        new or modified file_path to the stat key it had before indexing.
+        Cached files with a bulk binary placeholder at one of value_paths
+        are indexed again, so the binary values checked are read as text.
+        """
+
+        file_dicts = []
+        tag_dicts = {}
+        misses = {}
+
+        self.seen_paths.update(file_paths)
+
+        file_stats = {}
+        for file_path in file_paths:
+            try:
+                file_stats[file_path] = self.get_file_stat(file_path)
+            except OSError as e:
+                logging.error(f"Error reading {file_path}: {e}")
+
+        cached = {}
+        stat_paths = list(file_stats.keys())
+        for i in range(0, len(stat_paths), self.query_chunk_size):
+            chunk = stat_paths[i:i + self.query_chunk_size]
+            query = f"""SELECT file_path, file_size, file_mtime, file_inode, file_row, file_tags FROM file_index
+                        WHERE paths_version = ? AND file_path IN ({','.join('?' * len(chunk))})"""
+            for row in self.conn.execute(query, [self.paths_version] + chunk):
+                cached[row[0]] = row[1:]
+
+        for file_path, file_stat in file_stats.items():
+            entry = cached.get(file_path)
+            if entry is not None and tuple(entry[0:3]) == file_stat:
+                tag_dict = json.loads(entry[4])
+                if not self.has_binary_values(tag_dict, value_paths):
+                    file_dicts.append(json.loads(entry[3]))
+                    tag_dicts[file_path] = tag_dict
+                    continue
+            misses[file_path] = file_stat
+
+        self.hits += len(file_dicts)
+        self.misses += len(misses)
+
+        return file_dicts, tag_dicts, misses
+
+    def has_binary_values(self, tag_dict, value_paths):
+
+        # bulk binary values are cached as length + md5 when they were not checked at the time
+        if not value_paths:
+            return False
+
+        return any(isinstance(tag_dict.get(tag_path), str) and tag_dict[tag_path].startswith(file_indexer.binary_prefix) for tag_path in value_paths)
+
+    def store(self, file_dicts, tag_dicts, file_stats):
+        """Save freshly indexed files using the stat key captured before indexing."""
+
+        records = []
+        for file_dict in file_dicts:
+            file_path = file_dict['file_path']
+            file_stat = file_stats.get(file_path)
+            if file_stat is None:
+                continue
+            records.append((file_path, self.paths_version, file_stat[0], file_stat[1], file_stat[2],
+                            json.dumps(file_dict, default=str), json.dumps(tag_dicts.get(file_path, {}))))
+
+        with self.conn:
+            self.conn.executemany("""INSERT OR REPLACE INTO file_index
+                                     (file_path, paths_version, file_size, file_mtime, file_inode, file_row, file_tags)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?)""", records)
+
+    def prune(self, path):
+        """Remove cached files under path that were not looked up, they were deleted, moved or are no longer files."""
+
+        # only the walked directory, the cache can be shared with other input directories
+        root = os.path.join(path, '')
+        rows = self.conn.execute("SELECT DISTINCT file_path FROM file_index WHERE substr(file_path, 1, ?) = ?", (len(root), root))
+        removed = [file_path for (file_path,) in rows if file_path not in self.seen_paths]
+
+        with self.conn:
+            for i in range(0, len(removed), self.query_chunk_size):
+                chunk = removed[i:i + self.query_chunk_size]
+                self.conn.execute(f"DELETE FROM file_index WHERE file_path IN ({','.join('?' * len(chunk))})", chunk)
+
+        self.pruned += len(removed)
+
+    def close(self):
+
+        logging.info(f'Index Cache: {self.hits} Unchanged Files Reused, {self.misses} Files Indexed, {self.pruned} Removed Files Pruned')
+        self.conn.close()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to cache OCR results of burned in text regions between runs
+
+"""
+
+import logging
+
+from modules.cache_helper import cache_helper
+
+class ocr_cache(object):
+
+    # Bump when the way regions are cropped and scaled before OCR changes,
+    # or what is stored changes (see cache_helper)
+    cache_version = '3'
+
+    # rows per IN (...) query, below the SQLite host parameter limit
+    query_chunk_size = 100
+
+    def __init__(self, cache_file, signature=''):
+
+        self.cache_file = cache_file
+        self.signature = f'{self.cache_version}|{signature}'
+
+        # every validation worker reads and writes the cache, wait for their locks
+        self.conn = cache_helper(cache_file, self.signature, timeout=60).open(['ocr_text'], 'OCR Cache')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS ocr_text (
+                                pixel_digest TEXT,
+                                frame INTEGER,
+                                bounding_box TEXT,
+                                engine TEXT,
+                                ocr_text TEXT,
+                                PRIMARY KEY (pixel_digest, frame, bounding_box, engine))""")
+
+    def get_key(self, pixel_digest, frame, bounding_box, engine):
+        """Return the cache key of one region: (pixel_digest, frame, bounding_box, engine)."""
+        return (pixel_digest, frame, ','.join(str(value) for value in bounding_box), engine)
+
+    def lookup(self, keys):
+        """Return {key: ocr_text} for the keys already in the cache."""
+
+        cached = {}
+
+        keys = list(set(keys))
+        for i in range(0, len(keys), self.query_chunk_size):
+            chunk = keys[i:i + self.query_chunk_size]
+            conditions = ' OR '.join(['(pixel_digest = ? AND frame = ? AND bounding_box = ? AND engine = ?)'] * len(chunk))
+            query = f"SELECT pixel_digest, frame, bounding_box, engine, ocr_text FROM ocr_text WHERE {conditions}"
+            for row in self.conn.execute(query, [value for key in chunk for value in key]):
+                cached[tuple(row[0:4])] = row[4]
+
+        return cached
+
+    def store(self, results):
+        """Save {key: ocr_text} for freshly read regions."""
+
+        if not results:
+            return
+
+        with self.conn:
+            self.conn.executemany("""INSERT OR REPLACE INTO ocr_text
+                                     (pixel_digest, frame, bounding_box, engine, ocr_text)
+                                     VALUES (?, ?, ?, ?, ?)""", [key + (ocr_text,) for key, ocr_text in results.items()])
+
+    def close(self):
+
+        self.conn.close()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to read bounding box regions of an image's pixel data
+
+"""
+
+import numpy as np
+import pydicom
+from pydicom.dataelem import RawDataElement
+from pydicom.uid import ImplicitVRLittleEndian, ExplicitVRLittleEndian
+from pydicom.pixel_data_handlers.util import pixel_dtype
+from modules.file_indexer import file_indexer
+
+class region_reader(object):
+
+    # Native (uncompressed) syntaxes whose Pixel Data is stored as is in the file, they are memory mapped.
+    # Every other syntax (encapsulated, deflated, big endian) is decoded in full through pixel_array.
+    native_syntaxes = [ImplicitVRLittleEndian, ExplicitVRLittleEndian]
+
+    # Pixel Data (and other values) above this size are left on disk when the header is read
+    defer_size = 1024 * 1024
+
+    def __init__(self, file_path):
+
+        self.file_path = file_path
+
+        # header only, Pixel Data is read later: mapped or decoded
+        self.dataset = pydicom.dcmread(file_path, defer_size=self.defer_size)
+
+        self.frames = int(self.dataset.get('NumberOfFrames', 1) or 1)
+
+        self.pixel_map = None
+        self.pixel_array = None
+        self.decode_error = None
+
+    def get_region(self, bounding_box, frame=0):
+        """Return the pixel values of bounding_box (start_x, start_y, end_x, end_y) in frame, as pixel_array has them."""
+
+        frame_data = self.get_frame(frame)
+
+        return np.array(frame_data[bounding_box[1]:bounding_box[3], bounding_box[0]:bounding_box[2]])
+
+    def get_frame(self, frame):
+
+        if self.pixel_map is None and self.pixel_array is None:
+            self.pixel_map = self.map_pixel_data()
+
+        if self.pixel_map is not None:
+            return self.pixel_map[frame]
+
+        if self.pixel_array is None:
+            self.pixel_array = self.decode_pixel_data()
+
+        # pixel_array has no frame axis for single frame images
+        return self.pixel_array[frame] if self.frames > 1 else self.pixel_array
+
+    def map_pixel_data(self):
+        """Memory map native Pixel Data as (frames, rows, columns[, samples]), None where it has to be decoded."""
+
+        dataset = self.dataset
+
+        file_meta = getattr(dataset, 'file_meta', None)
+        if file_meta is None or file_meta.get('TransferSyntaxUID') not in self.native_syntaxes:
+            return None
+
+        if 'PixelData' not in dataset:
+            return None
+
+        # the stored element, a deferred value is not read in
+        pixel_element = file_indexer().get_raw_element(dataset, 'PixelData')
+        if not isinstance(pixel_element, RawDataElement) or pixel_element.value_tell is None or pixel_element.length == 0xFFFFFFFF:
+            return None
+
+        rows = dataset.get('Rows')
+        columns = dataset.get('Columns')
+        samples = dataset.get('SamplesPerPixel', 1)
+        bits_allocated = dataset.get('BitsAllocated')
+
+        # bit packed and resampled (YBR_FULL_422) data are left to the pixel data handlers
+        if not rows or not columns or not samples or bits_allocated not in [8, 16, 32]:
+            return None
+        if dataset.get('PhotometricInterpretation') == 'YBR_FULL_422':
+            return None
+
+        dtype = pixel_dtype(dataset)
+        pixel_count = self.frames * rows * columns * samples
+        if pixel_element.length < pixel_count * dtype.itemsize:
+            return None
+
+        if pixel_element.value is not None:
+            # small enough to have been read with the header
+            pixel_data = np.frombuffer(pixel_element.value, dtype=dtype, count=pixel_count)
+        else:
+            pixel_data = np.memmap(self.file_path, dtype=dtype, mode='r', offset=pixel_element.value_tell, shape=(pixel_count,))
+
+        # same layout pixel_array has, with a frame axis for single frame images too
+        if samples == 1:
+            return pixel_data.reshape(self.frames, rows, columns)
+        if dataset.get('PlanarConfiguration', 0) == 1:
+            return pixel_data.reshape(self.frames, samples, rows, columns).transpose(0, 2, 3, 1)
+        return pixel_data.reshape(self.frames, rows, columns, samples)
+
+    def decode_pixel_data(self):
+
+        # a failed decode is not repeated for every region of the file
+        if self.decode_error is not None:
+            raise self.decode_error
+
+        try:
+            # Pixel Data deferred with the header is read from the file here
+            return self.dataset.pixel_array
+        except Exception as e:
+            self.decode_error = e
+            raise
+
+    def close(self):
+
+        self.pixel_map = None
+        self.pixel_array = None
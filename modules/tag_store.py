@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to hand the flattened tags of a run's files to the validation workers
+
+"""
+
+import os
+import json
+import pathlib
+import sqlite3 as sql
+
+class tag_store(object):
+
+    # The directory indexer writes the tags of each file here as its batch completes,
+    # validation workers read the tags of their own batch by file_path. Neither the
+    # parent process nor the batch tasks hold the tags of every file.
+
+    # file paths per IN (...) query, below the SQLite host parameter limit
+    query_chunk_size = 500
+
+    def __init__(self, store_file):
+
+        self.store_file = store_file
+        self.conn = None
+
+    def create(self):
+        """Start an empty store, replacing the file of an earlier run."""
+
+        if os.path.exists(self.store_file):
+            os.remove(self.store_file)
+
+        self.conn = sql.connect(self.store_file)
+        # scratch file of a single run, nothing to recover after a crash
+        self.conn.execute("PRAGMA synchronous = OFF")
+        self.conn.execute("CREATE TABLE file_tags (file_path TEXT PRIMARY KEY, file_tags TEXT)")
+
+        return self
+
+    def open(self):
+        """Open the store of the current run read only, as the validation workers do."""
+
+        self.conn = sql.connect(f'{pathlib.Path(os.path.abspath(self.store_file)).as_uri()}?mode=ro', uri=True)
+
+        return self
+
+    def store(self, tag_dicts):
+
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO file_tags (file_path, file_tags) VALUES (?, ?)",
+                                  ((file_path, json.dumps(tag_dict)) for file_path, tag_dict in tag_dicts.items()))
+
+    def lookup(self, file_paths):
+        """Return {file_path: tag_dict} of the given files, files without tags are left out."""
+
+        tag_dicts = {}
+
+        file_paths = list(file_paths)
+        for i in range(0, len(file_paths), self.query_chunk_size):
+            chunk = file_paths[i:i + self.query_chunk_size]
+            query = f"SELECT file_path, file_tags FROM file_tags WHERE file_path IN ({','.join('?' * len(chunk))})"
+            for file_path, file_tags in self.conn.execute(query, chunk):
+                tag_dicts[file_path] = json.loads(file_tags)
+
+        return tag_dicts
+
+    def close(self):
+
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def remove(self):
+
+        self.close()
+        if os.path.exists(self.store_file):
+            os.remove(self.store_file)
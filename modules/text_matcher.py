@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+This module is used to match answer key text against file text
+
+"""
+
+import string
+import functools
+from nltk.tokenize import word_tokenize
+from nltk.corpus import stopwords
+
+class text_matcher(object):
+
+    # The same answer values (names, institutions, addresses) are checked against every
+    # instance of their series, so tokenized answers and whole match outcomes are cached.
+    token_cache_size = 4096
+    match_cache_size = 65536
+
+    def __init__(self):
+
+        self.stopwords = frozenset(stopwords.words('english'))
+        self.punctuation = frozenset(list(string.punctuation) + ['“','”','‘','’','``','•'])
+        self.ignored_tokens = self.stopwords | self.punctuation
+
+        self.get_answer_tokens = functools.lru_cache(maxsize=self.token_cache_size)(self.tokenize_answer)
+        self.match = functools.lru_cache(maxsize=self.match_cache_size)(self.match_text)
+
+    def get_stats(self):
+        """Return the (hits, misses) of the match cache and the answer token cache, counted since this process started."""
+
+        match_info = self.match.cache_info()
+        token_info = self.get_answer_tokens.cache_info()
+
+        return (match_info.hits, match_info.misses, token_info.hits, token_info.misses)
+
+    def tokenize_answer(self, answer_value):
+
+        # answer tokens a file value is checked for, stopwords and punctuation left out
+        return tuple(token for token in word_tokenize(answer_value) if token not in self.ignored_tokens)
+
+    def match_text(self, file_value, answer_value, method):
+        """Return (check_pass, check_score) of answer_value being retained or removed (method) in file_value."""
+
+        #-----------------------------
+        # Test variables
+        #-----------------------------
+
+        #file_value = "<The patient's address is 1261 AR 72223>"
+        #answer_value = '<1261 Leawood Street, Little Rock AR 72223>'
+
+        #file_value = "<12>"
+        #answer_value = "<12.0>"
+
+        #-----------------------------
+        check_pass = False
+        check_score = 0
+
+        file_value = file_value.replace('<','').replace('>','').lower()
+        answer_value = answer_value.replace('<','').replace('>','').lower()
+
+        #-----------------------------
+
+        def validate_number(file_value, answer_value, method):
+
+            file_value_fl = float(file_value)
+            answer_value_fl = float(answer_value)
+
+            retain = True if method == 'retain' else False
+
+            if answer_value_fl == file_value_fl:
+                check_pass, check_score = (True, 1.0) if retain else (False, 0.0)
+            else:
+                check_pass, check_score = (False, 0.0) if retain else (True, 1.0)
+
+            return check_pass, check_score
+
+        def tokenize_and_check(file_value, answer_value, method):
+
+            retain = True if method == 'retain' else False
+
+            answer_tokens = self.get_answer_tokens(answer_value)
+
+            total = len(answer_tokens)
+            retained = 0
+            removed = 0
+
+            for token in answer_tokens:
+                if token in file_value:
+                    retained += 1
+                else:
+                    removed += 1
+
+            if retain:
+                check_pass = True if retained == total else False
+                check_score = (retained / total)
+            else:
+                check_pass = True if removed == total else False
+                check_score = (removed / total)
+
+            return check_pass, check_score
+
+        #-----------------------------
+
+        if file_value.replace('.', '', 1).isdigit() and answer_value.replace('.', '', 1).isdigit():
+
+            check_pass, check_score = validate_number(file_value, answer_value, method)
+
+        else:
+
+            if str(answer_value) in file_value:
+                if method == 'retain':
+                    check_pass = True
+                    check_score = 1.0
+                elif method == 'remove':
+                    check_pass = False
+                    check_score = 0.0
+            else:
+                check_pass, check_score = tokenize_and_check(file_value, answer_value, method)
+
+        return check_pass, check_score
@@ -17,10 +17,10 @@ import time
 
 
 from modules.directory_indexer import directory_indexer
-#from modules.modality_organizer import modality_organizer
-#from modules.patient_organizer import patient_organizer
-#from modules.study_organizer import study_organizer
-#from modules.series_organizer import series_organizer
+from modules.index_cache import index_cache
+from modules.tag_store import tag_store
+from modules.ocr_cache import ocr_cache
+from modules.answer_compiler import answer_compiler
 from modules.file_organizer import file_organizer
 
 class validation_helper(object):
@@ -37,6 +37,15 @@ class validation_helper(object):
         patid_mapping_file = config['patid_mapping_file']
         multiproc = eval(config['multiprocessing'])
         multiproc_cpus = config['multiprocessing_cpus'] if 'multiprocessing_cpus' in config else 0
+        ocr_cpus = config['ocr_cpus'] if 'ocr_cpus' in config else ''
+        index_cache_file = config['index_cache_file'] if 'index_cache_file' in config else os.path.join(output_data_path, 'index_cache.db')
+        answer_cache_file = config['answer_cache_file'] if 'answer_cache_file' in config else os.path.join(output_data_path, 'answer_cache.db')
+        ocr_cache_file = config['ocr_cache_file'] if 'ocr_cache_file' in config else os.path.join(output_data_path, 'ocr_cache.db')
+        allow_no_preamble = eval(config['allow_no_preamble']) if 'allow_no_preamble' in config else False
+        stream_pixel_data = eval(config['stream_pixel_data']) if 'stream_pixel_data' in config else True
+        selective_indexing = eval(config['selective_indexing']) if 'selective_indexing' in config else False
+        validation_shard_by = config['validation_shard_by'] if 'validation_shard_by' in config else 'instance'
+        validation_engine = config['validation_engine'] if 'validation_engine' in config else 'row'
 
         # input_path
         # ---------------------------
@@ -54,6 +63,46 @@ class validation_helper(object):
             os.makedirs(self.output_path)
             
 
+        # index cache
+        # ---------------------------
+        # Kept outside of the run folder so it survives reruns. Blank disables the cache.
+        self.index_cache_file = index_cache_file
+
+        # ocr cache
+        # ---------------------------
+        # Burned in text read by OCR, keyed by pixel digest, bounding box and OCR engine.
+        # Kept outside of the run folder so it survives reruns. Blank disables the cache.
+        self.ocr_cache_file = ocr_cache_file
+        if self.ocr_cache_file:
+            # created (or cleared when stale) once here, before the workers share it
+            ocr_cache(self.ocr_cache_file).close()
+
+        # directory indexing
+        # ---------------------------
+        # Files without the DICOM preamble are skipped unless allowed
+        self.allow_no_preamble = allow_no_preamble
+        # Pixel Data is hashed from disk in chunks instead of being loaded
+        self.stream_pixel_data = stream_pixel_data
+        # Only flatten the tags referenced by the answer key
+        self.selective_indexing = selective_indexing
+
+        # validation sharding
+        # ---------------------------
+        # instance: batches of instances. series/study: whole series/studies per batch,
+        # so scoped answer rows reach every instance of their series/study.
+        if validation_shard_by not in ['instance', 'series', 'study']:
+            logging.error(f'Unknown validation_shard_by {validation_shard_by}, using instance')
+            validation_shard_by = 'instance'
+        self.validation_shard_by = validation_shard_by
+
+        # validation engine
+        # ---------------------------
+        # row: every check through the row validators. vector: tag level actions as column operations per batch.
+        if validation_engine not in ['row', 'vector']:
+            logging.error(f'Unknown validation_engine {validation_engine}, using row')
+            validation_engine = 'row'
+        self.validation_engine = validation_engine
+
         # validation db
         # ---------------------------
         self.validation_db_conn = sql.connect(os.path.join(self.output_path, "validation_results.db"))
@@ -62,12 +111,15 @@ class validation_helper(object):
 
         # answer data
         # ---------------------------
-        answer_db_conn = sql.connect(answer_db_file)
-        answer_query = "SELECT * FROM answer_data"
-        self.answer_df = pd.read_sql(answer_query, answer_db_conn)
-        answer_db_conn.close()
+        # AnswerData JSON is parsed once into an indexed answer key (SQLite), cached by answer DB hash.
+        # Workers query their own instances from it, the full key is never loaded here.
+        # One file per answer DB hash, named after answer_cache_file. Blank compiles it into the run folder instead.
+        answer_digest = answer_compiler().md5sum_file(answer_db_file)
+        self.answer_key_file = answer_compiler().get_key_file(answer_cache_file, answer_digest) if answer_cache_file else os.path.join(self.output_path, 'answer_key.db')
+        compiler = answer_compiler(self.answer_key_file)
+        compiler.compile_answer_key(answer_db_file, answer_digest)
 
-        logging.info(f'Answer Key Imported: {len(self.answer_df)} Records')
+        logging.info(f'Answer Key Imported: {compiler.get_answer_count()} Records')
 
         # uid mapping
         # ---------------------------
@@ -95,6 +147,8 @@ class validation_helper(object):
         # self.multiproc = multiproc in ['True','true','1']
         self.multiproc = multiproc 
         self.multiproc_cpus = 0 if multiproc_cpus == '' else int(multiproc_cpus)
+        # OCR stage workers, each holds its own OCR model. Blank uses multiprocessing_cpus.
+        self.ocr_cpus = 0 if ocr_cpus == '' else int(ocr_cpus)
 
         # logging
         # ---------------------------
@@ -109,8 +163,20 @@ class validation_helper(object):
         # Index directory
         #-------------------------------------
         logging.info('Directory Indexing Started')
-        dir_indexer = directory_indexer()
-        dir_df = dir_indexer.get_directory_listing(self.input_path, self.multiproc, self.multiproc_cpus)
+        # binary values of the tag paths the answer key checks are indexed as text, never as length + md5
+        answer_tag_paths = answer_compiler(self.answer_key_file).get_tag_paths()
+        tag_paths = None
+        if self.selective_indexing:
+            tag_paths = answer_tag_paths
+            logging.info(f'Selective Indexing: {len(tag_paths)} Tag Paths Referenced by Answer Key')
+        dir_indexer = directory_indexer(self.allow_no_preamble, self.stream_pixel_data, tag_paths, answer_tag_paths)
+        dir_cache = index_cache(self.index_cache_file, dir_indexer.get_index_signature(), dir_indexer.get_paths_version()) if self.index_cache_file else None
+        # flattened tags of every file, read back by the validation workers
+        tags = tag_store(os.path.join(self.output_path, 'file_tags.db')).create()
+        dir_df = dir_indexer.get_directory_listing(self.input_path, self.multiproc, self.multiproc_cpus, tags, dir_cache)
+        tags.close()
+        if dir_cache is not None:
+            dir_cache.close()
         logging.debug(f'Directory Listing: {len(dir_df)} Files Indexed')
         logging.info(f'Directory Indexing Complete')
 
@@ -119,20 +185,12 @@ class validation_helper(object):
         #-------------------------------------        
         logging.info('Validation Started')
         
-        #mod_organizer = modality_organizer()
-        #validation_df = mod_organizer.run_validation(dir_df, self.output_path, self.answer_df, self.uids_old_to_new, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level)
-
-        #pat_organizer = patient_organizer()
-        #validation_df = pat_organizer.run_validation(dir_df, self.output_path, self.answer_df, self.uids_old_to_new, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level)
-
-        #stu_organizer = study_organizer()
-        #validation_df = stu_organizer.run_validation(dir_df, self.output_path, self.answer_df, self.uids_old_to_new, self.uids_new_to_old, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level)
-        
-        #ser_organizer = series_organizer()
-        #validation_df = ser_organizer.run_validation(dir_df, self.output_path, self.answer_df, self.uids_old_to_new, self.uids_new_to_old, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level)        
-        
+        # series and study grouping is done by file_organizer, see validation_shard_by
         f_organizer = file_organizer()
-        validation_df = f_organizer.run_validation(dir_df, self.output_path, self.answer_df, self.uids_old_to_new, self.uids_new_to_old, self.patids_old_to_new, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level)        
+        try:
+            validation_df = f_organizer.run_validation(dir_df, tags.store_file, self.output_path, self.answer_key_file, self.uids_old_to_new, self.uids_new_to_old, self.patids_old_to_new, self.multiproc, self.multiproc_cpus, self.log_path, self.log_level, self.validation_shard_by, self.validation_engine, self.ocr_cache_file, self.ocr_cpus)
+        finally:
+            tags.remove()
         
         validation_df = validation_df.reset_index(drop=True)
         
@@ -140,14 +198,19 @@ class validation_helper(object):
 
         logging.info('Generating Categories')
         
-        tqdm.pandas(desc="Parsing JSON")        
-        validation_df['category_json'] = validation_df['answer_category_v2'].progress_apply(lambda x: json.loads(x.strip('<>')))
+        # Results carry the check_id of their check, categories are looked up once per check
+        # and each distinct category is parsed once, instead of once per result row.
+        check_categories = answer_compiler(self.answer_key_file).get_categories(validation_df['check_id'].unique())
+        category_text = validation_df['check_id'].map(check_categories)
+        unique_categories = category_text.unique()
+
+        category_json = [json.loads(category) for category in tqdm(unique_categories, desc="Parsing JSON")]
                
         # progress_bar = tqdm(total=1, desc="Normalizing JSON")       
         #progress_bar.set_description("Normalizing JSON")
-        logging.info('Normalizing JSON')
-        json_df = pd.json_normalize(validation_df['category_json'])        
-        json_df.index = validation_df.index
+        logging.info(f'Normalizing JSON: {len(unique_categories)} Distinct Categories')
+        json_df = pd.json_normalize(category_json)        
+        json_df.index = unique_categories
         json_df.rename(columns={'hipaa.z':'hipaa_z','hipaa.m':'hipaa_m','dicom.p15':'dicom_p15','dicom.iod':'dicom_iod',
                                 'dicom.safe':'dicom_safe','tcia.ptkb':'tcia_ptkb','tcia.p15':'tcia_p15','tcia.rev':'tcia_rev'}, inplace=True)        
         json_df['prev_cat'] = json_df['prev_cat'].astype(str)      
@@ -158,7 +221,9 @@ class validation_helper(object):
         # progress_bar = tqdm(total=1, desc="Combining JSON")
         #progress_bar.set_description("Combining JSON")
         logging.info('Combining JSON')
-        combined_df = pd.concat([validation_df.drop(columns=['category_json', 'answer_category_v2']), json_df], axis=1)
+        json_df = json_df.reindex(category_text)
+        json_df.index = validation_df.index
+        combined_df = pd.concat([validation_df.drop(columns=['check_id']), json_df], axis=1)
         # progress_bar.update(1)
         # progress_bar.close()
 
@@ -174,7 +239,10 @@ class validation_helper(object):
             # Create Burn-in validation spreadsheet
             #-------------------------------------        
             pixel_val_df = validation_df[validation_df.action == '<pixels_hidden>']
-            pixel_val_df = pixel_val_df[['check_passed','check_score','action','action_text','file_path','modality','class','patient','study','series','instance']]        
+            pixel_val_df = pixel_val_df[['check_passed','check_score','action','action_text','file_path','modality','class','patient','study','series','instance','ocr_status']]        
+            # how often OCR was run, skipped as a blank region or served from the OCR cache
+            ocr_status_counts = pixel_val_df['ocr_status'].value_counts().to_dict()
+            logging.info(f'Pixel Validation OCR Status: {ocr_status_counts}')
             pixel_val_df['file_path'] = pixel_val_df['file_path'].apply(lambda x: str(x).replace('<','').replace('>',''))            
             pixel_val_df.to_excel(os.path.join(self.output_path, "pixel_validation.xlsx"))
         else:
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3 as sql
+import pandas as pd
+
+from modules.answer_compiler import answer_compiler
+
+
+def make_answer_db(tmp_path, name, modality):
+
+    answer_data = pd.DataFrame([{'StudyInstanceUID': '1.2.3.1', 'SeriesInstanceUID': '1.2.3.1.1', 'SOPInstanceUID': '1.2.3.1.1.1',
+                                 'Modality': modality, 'SOPClassUID': '1.2.840.10008.5.1.4.1.1.2', 'PatientID': 'PAT1', 'scope': '<Instance>',
+                                 'AnswerData': json.dumps({'0': {'action': '<tag_retained>', 'action_text': None, 'value': f'<{modality}>',
+                                                                 'tag': '<(0008,0060)>', 'tag_ds': '<(0008,0060)>', 'tag_name': '<Modality>',
+                                                                 'answer_category_v2': None}})}])
+
+    answer_db_file = os.path.join(tmp_path, name)
+    conn = sql.connect(answer_db_file)
+    answer_data.to_sql('answer_data', conn, index=False)
+    conn.close()
+
+    return answer_db_file
+
+
+def compile_cached(cache_file, answer_db_file):
+
+    key_file = answer_compiler().get_key_file(cache_file, answer_compiler().md5sum_file(answer_db_file))
+    answer_compiler(key_file).compile_answer_key(answer_db_file)
+
+    return key_file
+
+
+def test_key_file_per_answer_db(tmp_path):
+
+    cache_file = os.path.join(tmp_path, 'answer_cache.db')
+    ct_db_file = make_answer_db(tmp_path, 'ct.db', 'CT')
+    mr_db_file = make_answer_db(tmp_path, 'mr.db', 'MR')
+
+    ct_key_file = compile_cached(cache_file, ct_db_file)
+    ct_stat = os.stat(ct_key_file)
+
+    # another answer DB gets its own key file, the first one is left alone and reused as is
+    mr_key_file = compile_cached(cache_file, mr_db_file)
+    assert mr_key_file != ct_key_file
+    assert compile_cached(cache_file, ct_db_file) == ct_key_file
+    assert (os.stat(ct_key_file).st_ino, os.stat(ct_key_file).st_mtime_ns) == (ct_stat.st_ino, ct_stat.st_mtime_ns)
+
+    assert answer_compiler(ct_key_file).get_answer_data(['1.2.3.1.1.1'])[1]['value'].tolist() == ['<CT>']
+    assert answer_compiler(mr_key_file).get_answer_data(['1.2.3.1.1.1'])[1]['value'].tolist() == ['<MR>']
+
+    # keys are written to a temporary file and moved into place
+    assert not [file_name for file_name in os.listdir(tmp_path) if file_name.endswith('.tmp')]
+
+
+def test_stale_key_file_recompiled(tmp_path):
+
+    answer_db_file = make_answer_db(tmp_path, 'ct.db', 'CT')
+    key_file = os.path.join(tmp_path, 'answer_key.db')
+
+    # a key file left by an older compiler version
+    conn = sql.connect(key_file)
+    conn.execute("CREATE TABLE cache_info (key TEXT PRIMARY KEY, value TEXT)")
+    conn.execute("INSERT INTO cache_info (key, value) VALUES ('signature', '0|old')")
+    conn.commit()
+    conn.close()
+
+    answer_compiler(key_file).compile_answer_key(answer_db_file)
+
+    assert answer_compiler(key_file).get_answer_count() == 1
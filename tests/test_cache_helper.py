@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+from modules.cache_helper import cache_helper
+from modules.ocr_cache import ocr_cache
+
+
+def open_cache(cache_file, signature):
+
+    conn = cache_helper(cache_file, signature).open(['cached'], 'Test Cache')
+    conn.execute("CREATE TABLE IF NOT EXISTS cached (value TEXT)")
+
+    return conn
+
+
+def test_signature_change_clears_cache(tmp_path):
+
+    cache_file = os.path.join(tmp_path, 'cache', 'test_cache.db')
+
+    conn = open_cache(cache_file, '1|a')
+    with conn:
+        conn.execute("INSERT INTO cached (value) VALUES ('x')")
+    conn.close()
+
+    # same signature, data is reused
+    conn = open_cache(cache_file, '1|a')
+    assert conn.execute("SELECT COUNT(*) FROM cached").fetchone()[0] == 1
+    conn.close()
+
+    # another signature, data is dropped
+    conn = open_cache(cache_file, '1|b')
+    assert conn.execute("SELECT COUNT(*) FROM cached").fetchone()[0] == 0
+    conn.close()
+
+    assert cache_helper(cache_file).read_signature() == '1|b'
+    assert cache_helper(os.path.join(tmp_path, 'missing.db')).read_signature() is None
+
+
+def test_ocr_cache_invalidation(tmp_path, monkeypatch):
+
+    cache_file = os.path.join(tmp_path, 'ocr_cache.db')
+
+    cache = ocr_cache(cache_file)
+    key = cache.get_key('abc123', 0, (10, 20, 30, 40), 'easyocr')
+    cache.store({key: 'JOHN DOE'})
+    cache.close()
+
+    cache = ocr_cache(cache_file)
+    assert cache.lookup([key, cache.get_key('abc123', 0, (0, 0, 5, 5), 'easyocr')]) == {key: 'JOHN DOE'}
+    cache.close()
+
+    # cropping or scaling changed (version bump): regions are read again
+    monkeypatch.setattr(ocr_cache, 'cache_version', 'test')
+    cache = ocr_cache(cache_file)
+    assert cache.lookup([key]) == {}
+    cache.close()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import numpy as np
+import pytest
+from pydicom import dcmread
+from pydicom.dataelem import RawDataElement
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.tag import Tag
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, JPEGBaseline8Bit
+
+from modules.directory_indexer import directory_indexer
+from modules.tag_store import tag_store
+
+
+def write_dicom(file_path, transfer_syntax, blob_size=0):
+
+    # 2 frames of 512 x 600 16 bit pixels (1.2 MB, more than defer_size) or their encapsulated stand-ins
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    meta.MediaStorageSOPInstanceUID = '1.2.3.1.1'
+    meta.TransferSyntaxUID = transfer_syntax
+
+    dataset = FileDataset(str(file_path), {}, file_meta=meta, preamble=b'\0' * 128)
+    dataset.SOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    dataset.SOPInstanceUID = '1.2.3.1.1'
+    dataset.Modality = 'CT'
+    if blob_size:
+        dataset.add_new(0x00190010, 'LO', 'ACME CORP')
+        dataset.add_new(0x00191002, 'OB', (np.arange(blob_size) % 251).astype(np.uint8).tobytes())
+    dataset.Rows, dataset.Columns, dataset.NumberOfFrames = 512, 600, 2
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = 'MONOCHROME2'
+    dataset.BitsAllocated, dataset.BitsStored, dataset.HighBit, dataset.PixelRepresentation = 16, 12, 11, 0
+    pixels = (np.arange(2 * 512 * 600) % 4096).astype(np.uint16)
+    if transfer_syntax == JPEGBaseline8Bit:
+        dataset.PixelData = encapsulate([pixels[:1000].tobytes(), pixels[1000:2001].tobytes()])
+    else:
+        dataset.PixelData = pixels.tobytes()
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = transfer_syntax == ImplicitVRLittleEndian
+    dataset.save_as(str(file_path), write_like_original=False)
+
+
+@pytest.mark.parametrize('header, is_dicom', [
+    (struct.pack('<HH', 0x0008, 0x0005) + b'CS' + struct.pack('<H', 10), True),      # explicit VR
+    (struct.pack('<HH', 0x0008, 0x0005) + struct.pack('<L', 10), True),              # implicit VR, plausible length
+    (struct.pack('<HH', 0x0008, 0x0005) + b'A[' + struct.pack('<H', 0xFFFF), False), # not a VR, length past the end
+    (struct.pack('<HH', 0x0010, 0x0010) + b'PN' + struct.pack('<H', 10), False),     # unknown first group
+])
+def test_sniff_file_without_preamble(tmp_path, header, is_dicom):
+
+    file_path = tmp_path / 'f.dcm'
+    file_path.write_bytes(header + b'\0' * 10)
+
+    with open(file_path, 'rb') as dcm:
+        assert directory_indexer(allow_no_preamble=True).sniff_file(dcm)[0] == is_dicom
+
+
+def test_sniff_file_with_preamble(tmp_path):
+
+    file_path = tmp_path / 'f.dcm'
+    file_path.write_bytes(b'\0' * 128 + b'DICM' + b'\0' * 8)
+
+    with open(file_path, 'rb') as dcm:
+        assert directory_indexer().sniff_file(dcm) == (True, False, None)
+
+
+@pytest.mark.parametrize('transfer_syntax', [ExplicitVRLittleEndian, ImplicitVRLittleEndian, JPEGBaseline8Bit])
+def test_streamed_index_matches_loaded(tmp_path, transfer_syntax):
+
+    # a private binary above defer_size is hashed from disk too
+    file_path = str(tmp_path / 'f.dcm')
+    write_dicom(file_path, transfer_syntax, 2 * 1024 * 1024)
+
+    streamed = directory_indexer(stream_pixel_data=True).index_files([file_path])
+    loaded = directory_indexer(stream_pixel_data=False).index_files([file_path])
+
+    assert streamed == loaded
+    assert streamed[1][file_path]['<(0019,"ACME CORP",02)>'].startswith('<BINARY length=2097152 ')
+
+
+def test_md5sum_element_encapsulated(tmp_path):
+
+    # an encapsulated value left on disk: every item up to the sequence delimiter, as pydicom loads it
+    file_path = str(tmp_path / 'f.dcm')
+    write_dicom(file_path, JPEGBaseline8Bit)
+
+    with open(file_path, 'rb') as dcm:
+        file_bytes = dcm.read()
+        value_tell = file_bytes.index(struct.pack('<HH', 0x7FE0, 0x0010) + b'OB\0\0' + struct.pack('<L', 0xFFFFFFFF)) + 12
+        element = RawDataElement(Tag(0x7FE00010), 'OB', 0xFFFFFFFF, None, value_tell, False, True)
+
+        indexer = directory_indexer()
+        assert indexer.md5sum_element(dcm, element) == indexer.md5sum_data(dcmread(file_path).PixelData)
+
+
+def test_listing_stores_indexed_tags(tmp_path):
+
+    # the directory rows are returned, the tags the files are indexed with go to the tag store
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    write_dicom(data_path / 'f0.dcm', ExplicitVRLittleEndian)
+    write_dicom(data_path / 'f1.dcm', ImplicitVRLittleEndian, 2048)
+
+    indexer = directory_indexer()
+    tags = tag_store(os.path.join(tmp_path, 'file_tags.db')).create()
+    dir_df = indexer.get_directory_listing(str(data_path), False, 1, tags)
+
+    file_dicts, tag_dicts, skipped = indexer.index_files(list(dir_df['file_path']))
+    assert dir_df.to_dict('records') == file_dicts
+    assert tags.lookup(dir_df['file_path']) == tag_dicts
+    tags.remove()
@@ -0,0 +1,210 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import sqlite3 as sql
+import pandas as pd
+import pytest
+
+from modules.answer_compiler import answer_compiler
+from modules.file_organizer import file_organizer
+from modules.curation_validator import curation_validator
+from modules.tag_store import tag_store
+
+
+def make_answer_key(tmp_path, answer_rows=None):
+
+    # (SOPInstanceUID, scope, AnswerData) rows, by default one row for an instance that is not on disk
+    if answer_rows is None:
+        answer_rows = [('1.2.3.1.1.1', '<Instance>', {'0': {'action': '<tag_retained>', 'action_text': None, 'value': '<CT>',
+                                                             'tag': '<(0008,0060)>', 'tag_ds': '<(0008,0060)>', 'tag_name': '<Modality>',
+                                                             'answer_category_v2': None}})]
+
+    answer_data = pd.DataFrame([{'StudyInstanceUID': sop.rsplit('.', 2)[0], 'SeriesInstanceUID': sop.rsplit('.', 1)[0], 'SOPInstanceUID': sop,
+                                 'Modality': 'CT', 'SOPClassUID': '1.2.840.10008.5.1.4.1.1.2', 'PatientID': 'PAT1', 'scope': scope,
+                                 'AnswerData': json.dumps(checks)} for sop, scope, checks in answer_rows])
+
+    answer_db_file = os.path.join(tmp_path, 'answers.db')
+    conn = sql.connect(answer_db_file)
+    answer_data.to_sql('answer_data', conn, index=False)
+    conn.close()
+
+    answer_key_file = os.path.join(tmp_path, 'answer_key.db')
+    answer_compiler(answer_key_file).compile_answer_key(answer_db_file)
+
+    return answer_key_file
+
+
+def make_tag_store(tmp_path, tag_dicts):
+
+    tags = tag_store(os.path.join(tmp_path, 'file_tags.db')).create()
+    tags.store(tag_dicts)
+    tags.close()
+
+    return tags.store_file
+
+
+@pytest.mark.parametrize('shard_by', ['instance', 'series'])
+@pytest.mark.parametrize('engine', ['row', 'vector'])
+def test_unmapped_series(tmp_path, shard_by, engine):
+
+    # a series whose files are all missing from the UID mapping, so its batch has no answer rows
+    dir_df = pd.DataFrame([{'class': '1.2.840.10008.5.1.4.1.1.2', 'modality': 'CT', 'patient': 'NEWPAT9', 'study': '9.9.1',
+                            'series': '9.9.1.1', 'instance': f'9.9.1.1.{i}', 'instance_num': i, 'file_name': f'f{i}.dcm',
+                            'file_path': os.path.join(tmp_path, f'f{i}.dcm'), 'file_digest': None, 'file_size': 1024} for i in range(2)])
+    tag_dicts = {file_path: {'<(0008,0060)>': '<CT>'} for file_path in dir_df['file_path']}
+
+    answer_key_file = make_answer_key(tmp_path)
+
+    uids_old_to_new = {'<1.2.3.1>': '<5.5.1>', '<1.2.3.1.1>': '<5.5.1.1>', '<1.2.3.1.1.1>': '<5.5.1.1.1>'}
+    uids_new_to_old = {'5.5.1': '1.2.3.1', '5.5.1.1': '1.2.3.1.1', '5.5.1.1.1': '1.2.3.1.1.1'}
+
+    validation_df = file_organizer().run_validation(dir_df, make_tag_store(tmp_path, tag_dicts), str(tmp_path), answer_key_file, uids_old_to_new, uids_new_to_old, {},
+                                                    False, 1, os.path.join(tmp_path, 'validation.log'), 'INFO', shard_by, engine)
+
+    # only the answer key instance is reported, as a missing file
+    assert len(validation_df) == 1
+    assert validation_df['check_passed'].tolist() == [False]
+
+
+def test_group_batches_keep_files_without_group():
+
+    # files without a series uid are batched one group each, none are left out
+    dir_df = pd.DataFrame({'instance': ['1', '2', '3', '4', '5'], 'series': ['9.1', '9.1', None, '9.2', None]})
+
+    file_batches = file_organizer().get_group_batches(dir_df, 'series', 2)
+
+    assert sorted(sop for batch in file_batches for sop in batch) == ['1', '2', '3', '4', '5']
+    assert ['1', '2'] in file_batches
+
+
+def test_pack_batches_cut_by_cost():
+
+    # one expensive instance is not packed with the cheap ones that follow it
+    instance_costs = {'1': 0.4, '2': 0.1, '3': 0.1, '4': 0.1}
+
+    file_batches = file_organizer().pack_batches([['1'], ['2'], ['3'], ['4']], 2, instance_costs)
+
+    assert file_batches == [['1'], ['2', '3'], ['4']]
+    assert file_organizer().pack_batches([['1'], ['2'], ['3'], ['4']], 2) == [['1', '2'], ['3', '4']]
+
+
+def test_pack_batches_equal_costs():
+
+    # equal costs give the same batches as packing by count alone, no extra batch
+    sops = [str(i) for i in range(11)]
+
+    file_batches = file_organizer().pack_batches([[sop] for sop in sops], 6, {sop: 0.013 for sop in sops})
+
+    assert [len(batch) for batch in file_batches] == [6, 5]
+
+
+@pytest.mark.parametrize('shard_by', ['instance', 'series', 'study'])
+def test_costs_keep_scoped_results(tmp_path, shard_by):
+
+    # series 0 has a series scoped check on its first instance, which also has many instance checks (an expensive instance)
+    old_sops = [f'1.2.3.1.1.{i}' for i in range(3)] + ['1.2.3.1.2.0']
+    new_sops = [f'5.5.1.1.{i}' for i in range(3)] + ['5.5.1.2.0']
+
+    check = {'action': '<tag_retained>', 'action_text': None, 'value': '<CT>', 'tag': '<(0008,0060)>', 'tag_ds': '<(0008,0060)>',
+             'tag_name': '<Modality>', 'answer_category_v2': None}
+    answer_rows = [(old_sops[0], '<Series>', {'0': check}),
+                   (old_sops[0], '<Instance>', {str(i): check for i in range(40)}),
+                   (old_sops[3], '<Instance>', {'0': check})]
+    answer_key_file = make_answer_key(tmp_path, answer_rows)
+
+    dir_df = pd.DataFrame([{'class': '1.2.840.10008.5.1.4.1.1.2', 'modality': 'CT', 'patient': 'NEWPAT1', 'study': '5.5.1',
+                            'series': new_sop.rsplit('.', 1)[0], 'instance': new_sop, 'instance_num': i, 'file_name': f'f{i}.dcm',
+                            'file_path': os.path.join(tmp_path, f'f{i}.dcm'), 'file_digest': None, 'file_size': 1024} for i, new_sop in enumerate(new_sops)])
+    tag_store_file = make_tag_store(tmp_path, {file_path: {'<(0008,0060)>': '<CT>'} for file_path in dir_df['file_path']})
+
+    uids_new_to_old = dict(zip(new_sops, old_sops))
+    uids_new_to_old.update({'5.5.1': '1.2.3.1', '5.5.1.1': '1.2.3.1.1', '5.5.1.2': '1.2.3.1.2'})
+    uids_old_to_new = {f'<{old}>': f'<{new}>' for new, old in uids_new_to_old.items()}
+
+    def run(organizer):
+        validation_df = organizer.run_validation(dir_df, tag_store_file, str(tmp_path), answer_key_file, uids_old_to_new, uids_new_to_old, {},
+                                                 False, 2, os.path.join(tmp_path, 'validation.log'), 'INFO', shard_by, 'row')
+        return validation_df.drop(columns=['file_index']).astype(str).sort_values(['instance', 'check_id']).reset_index(drop=True)
+
+    # no predicted costs, batches are cut by count alone
+    baseline = file_organizer()
+    baseline.cost_per_file = 0
+    baseline.cost_per_check = 0
+
+    # a high cost per check makes the first instance most of the predicted time
+    skewed = file_organizer()
+    skewed.cost_per_check = 1.0
+
+    baseline_df = run(baseline)
+
+    pd.testing.assert_frame_equal(run(skewed), baseline_df)
+    # the series scoped check reached the second instance of series 0, in the same count based instance batch
+    assert (baseline_df['instance'] == '<5.5.1.1.1>').sum() == 1
+
+
+def run_engine_batch(tmp_path, engine):
+
+    # one file with a check of every tag level action, edge cases included: missing tags, empty values, answer values that are not text
+    tmp_path = tmp_path / engine
+    tmp_path.mkdir()
+
+    def check(action, tag_ds, check_value=None, action_text=None):
+        return {'action': action, 'action_text': action_text, 'value': check_value, 'tag': tag_ds, 'tag_ds': tag_ds, 'tag_name': None,
+                'answer_category_v2': None}
+
+    checks = [check('<tag_retained>', '<(0008,0060)>', '<CT>'), check('<tag_retained>', '<(0008,1030)>'),
+              check('<text_notnull>', '<(0010,0010)>'), check('<text_notnull>', '<(0008,0060)>'),
+              check('<date_shifted>', '<(0008,0020)>', '<20200101>'), check('<date_shifted>', '<(0008,0020)>'), check('<date_shifted>', '<(0008,0021)>'),
+              check('<uid_changed>', '<(0020,000D)>', '<1.2.3.1>'),
+              check('<uid_consistent>', '<(0020,000D)>', '<1.2.3.1>'), check('<uid_consistent>', '<(0020,000D)>', '<9.9>'),
+              check('<patid_consistent>', '<(0010,0020)>', '<PAT1>'),
+              check('<pixels_retained>', '<(7FE0,0010)>', action_text='<abc123>'), check('<pixels_retained>', '<(7FE0,0010)>'),
+              check('<text_retained>', '<(0008,0060)>', '<CT>')]
+    answer_key_file = make_answer_key(tmp_path, [('1.2.3.1.1.1', '<Instance>', dict(enumerate(checks))),
+                                                 ('1.2.3.1.1.1', '<Series>', {'0': check('<tag_retained>', '<(0008,0060)>', '<CT>')})])
+
+    dir_df = pd.DataFrame([{'class': '1.2.840.10008.5.1.4.1.1.2', 'modality': 'CT', 'patient': 'NEWPAT1', 'study': '5.5.1', 'series': '5.5.1.1',
+                            'instance': '5.5.1.1.1', 'instance_num': 1, 'file_name': 'f1.dcm', 'file_path': os.path.join(tmp_path, 'f1.dcm'),
+                            'file_digest': 'abc123', 'file_size': 1024}])
+    tag_dicts = {dir_df['file_path'][0]: {'<(0008,0060)>': '<CT>', '<(0010,0010)>': '<>', '<(0008,0020)>': '<20200101>',
+                                          '<(0008,0021)>': None, '<(0020,000D)>': '<5.5.1>', '<(0010,0020)>': '<NEWPAT1>'}}
+
+    uids_new_to_old = {'5.5.1': '1.2.3.1', '5.5.1.1': '1.2.3.1.1', '5.5.1.1.1': '1.2.3.1.1.1'}
+    uids_old_to_new = {f'<{old}>': f'<{new}>' for new, old in uids_new_to_old.items()}
+
+    validation_df = file_organizer().run_validation(dir_df, make_tag_store(tmp_path, tag_dicts), str(tmp_path), answer_key_file, uids_old_to_new, uids_new_to_old, {'<PAT1>': '<NEWPAT1>'},
+                                                    False, 1, os.path.join(tmp_path, 'validation.log'), 'INFO', 'instance', engine)
+
+    return validation_df.reset_index(drop=True)
+
+
+def test_engines_match(tmp_path):
+
+    pd.testing.assert_frame_equal(run_engine_batch(tmp_path, 'vector'), run_engine_batch(tmp_path, 'row'))
+
+
+def test_engines_match_without_answer_values(tmp_path, monkeypatch):
+
+    # no check of the batch has an answer value, so the value column is read as float (NaN)
+    get_answer_data = answer_compiler.get_answer_data
+
+    def get_float_answer_data(self, sop_uids):
+        answer_rows, check_data = get_answer_data(self, sop_uids)
+        return answer_rows, check_data.assign(value=float('nan'))
+
+    monkeypatch.setattr(answer_compiler, 'get_answer_data', get_float_answer_data)
+
+    pd.testing.assert_frame_equal(run_engine_batch(tmp_path, 'vector'), run_engine_batch(tmp_path, 'row'))
+
+
+def test_vector_engine_falls_back_to_row_validators(tmp_path, monkeypatch):
+
+    # a failing vector pass still gives a result (or an error row) per check
+    def fail(*args):
+        raise ValueError('vector pass failed')
+
+    monkeypatch.setattr(curation_validator, 'validate_vector_checks', fail)
+
+    pd.testing.assert_frame_equal(run_engine_batch(tmp_path, 'vector'), run_engine_batch(tmp_path, 'row'))
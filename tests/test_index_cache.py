@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import numpy as np
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian
+
+from modules.directory_indexer import directory_indexer
+from modules.index_cache import index_cache
+from modules.tag_store import tag_store
+
+BLOB_PATH = '<(0019,"ACME CORP",02)>'
+MODALITY_PATH = '<(0008,0060)>'
+
+
+def write_dicom(file_path, sop_uid):
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    meta.MediaStorageSOPInstanceUID = sop_uid
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    dataset = FileDataset(str(file_path), {}, file_meta=meta, preamble=b'\0' * 128)
+    dataset.SOPClassUID = '1.2.840.10008.5.1.4.1.1.2'
+    dataset.SOPInstanceUID = sop_uid
+    dataset.StudyInstanceUID = '1.2.3'
+    dataset.SeriesInstanceUID = '1.2.3.1'
+    dataset.Modality = 'CT'
+    dataset.PatientID = 'PAT1'
+    # a private bulk binary value, indexed as length + md5 unless the answer key checks it
+    dataset.add_new(0x00190010, 'LO', 'ACME CORP')
+    dataset.add_new(0x00191002, 'OB', bytes(range(256)) * 20)
+    dataset.Rows, dataset.Columns = 8, 8
+    dataset.SamplesPerPixel = 1
+    dataset.PhotometricInterpretation = 'MONOCHROME2'
+    dataset.BitsAllocated, dataset.BitsStored, dataset.HighBit, dataset.PixelRepresentation = 16, 12, 11, 0
+    dataset.PixelData = np.arange(64, dtype=np.uint16).tobytes()
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = False
+    dataset.save_as(str(file_path), write_like_original=False)
+
+
+def make_files(tmp_path, count=2):
+
+    data_path = tmp_path / 'data'
+    data_path.mkdir()
+    for i in range(count):
+        write_dicom(data_path / f'f{i}.dcm', f'1.2.3.1.{i}')
+
+    return str(data_path)
+
+
+def index(data_path, cache_file, tag_paths=None, value_paths=None):
+
+    # one indexing run with the cache, returns (tag_dicts, cache)
+    indexer = directory_indexer(tag_paths=tag_paths, value_paths=value_paths)
+    cache = index_cache(cache_file, indexer.get_index_signature(), indexer.get_paths_version())
+    tags = tag_store(os.path.join(os.path.dirname(cache_file), 'file_tags.db')).create()
+    dir_df = indexer.get_directory_listing(data_path, False, 1, tags, cache)
+    cache.close()
+    tag_dicts = tags.lookup(dir_df['file_path'])
+    tags.remove()
+
+    return tag_dicts, cache
+
+
+def test_unchanged_files_reused(tmp_path):
+
+    data_path = make_files(tmp_path)
+    cache_file = os.path.join(tmp_path, 'index_cache.db')
+
+    first_tags, first_cache = index(data_path, cache_file)
+    tag_dicts, cache = index(data_path, cache_file)
+
+    assert (first_cache.hits, first_cache.misses) == (0, 2)
+    assert (cache.hits, cache.misses) == (2, 0)
+    assert tag_dicts == first_tags
+
+    # a modified file is indexed again
+    write_dicom(os.path.join(data_path, 'f0.dcm'), '1.2.3.1.9')
+    tag_dicts, cache = index(data_path, cache_file)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert tag_dicts[os.path.join(data_path, 'f0.dcm')]['<(0008,0018)>'] == '<1.2.3.1.9>'
+
+
+def test_checked_binary_read_as_text(tmp_path):
+
+    data_path = make_files(tmp_path)
+    cache_file = os.path.join(tmp_path, 'index_cache.db')
+
+    tag_dicts, cache = index(data_path, cache_file)
+    assert all(tags[BLOB_PATH].startswith('<BINARY length=5120') for tags in tag_dicts.values())
+
+    # another answer key does not clear the cache, files whose checked binary was cached as a digest are indexed again
+    tag_dicts, cache = index(data_path, cache_file, value_paths=[BLOB_PATH])
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert all(not tags[BLOB_PATH].startswith('<BINARY') for tags in tag_dicts.values())
+
+    tag_dicts, cache = index(data_path, cache_file, value_paths=[MODALITY_PATH])
+    assert (cache.hits, cache.misses) == (2, 0)
+
+    tag_dicts, cache = index(data_path, cache_file, value_paths=[BLOB_PATH])
+    assert (cache.hits, cache.misses) == (2, 0)
+
+
+def test_files_cached_per_tag_path_set(tmp_path):
+
+    data_path = make_files(tmp_path)
+    cache_file = os.path.join(tmp_path, 'index_cache.db')
+
+    index(data_path, cache_file, tag_paths=[MODALITY_PATH])
+    tag_dicts, cache = index(data_path, cache_file, tag_paths=[BLOB_PATH])
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert all(list(tags) == [BLOB_PATH] for tags in tag_dicts.values())
+
+    # switching back reuses the files of the first tag path set
+    tag_dicts, cache = index(data_path, cache_file, tag_paths=[MODALITY_PATH])
+    assert (cache.hits, cache.misses) == (2, 0)
+    assert all(tags == {MODALITY_PATH: '<CT>'} for tags in tag_dicts.values())
+
+
+def test_removed_files_pruned(tmp_path):
+
+    data_path = make_files(tmp_path, 3)
+    other_path = os.path.join(tmp_path, 'data_other')
+    os.makedirs(other_path)
+    write_dicom(os.path.join(other_path, 'f0.dcm'), '1.2.3.2.0')
+    cache_file = os.path.join(tmp_path, 'index_cache.db')
+
+    index(other_path, cache_file)
+    index(data_path, cache_file)
+    os.remove(os.path.join(data_path, 'f1.dcm'))
+    tag_dicts, cache = index(data_path, cache_file)
+
+    assert cache.pruned == 1
+    assert sorted(tag_dicts) == [os.path.join(data_path, 'f0.dcm'), os.path.join(data_path, 'f2.dcm')]
+
+    # files of another input directory sharing the cache are kept
+    tag_dicts, cache = index(other_path, cache_file)
+    assert (cache.hits, cache.pruned) == (1, 0)
+
+
+def test_version_change_clears_cache(tmp_path, monkeypatch):
+
+    data_path = make_files(tmp_path)
+    cache_file = os.path.join(tmp_path, 'index_cache.db')
+
+    index(data_path, cache_file)
+    monkeypatch.setattr(index_cache, 'cache_version', 'test')
+    tag_dicts, cache = index(data_path, cache_file)
+
+    assert (cache.hits, cache.misses) == (0, 2)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import numpy as np
+import pytest
+from pydicom import dcmread
+from pydicom.dataset import FileDataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.pixel_data_handlers.rle_handler import rle_encode_frame
+from pydicom.uid import ExplicitVRLittleEndian, ImplicitVRLittleEndian, RLELossless
+
+from modules.region_reader import region_reader
+
+
+def write_dicom(file_path, transfer_syntax, frames, rows, columns, samples=1, bits=16, planar=0):
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = '1.2.840.10008.5.1.4.1.1.7'
+    meta.MediaStorageSOPInstanceUID = '1.2.3.1.1'
+    meta.TransferSyntaxUID = transfer_syntax
+
+    dataset = FileDataset(str(file_path), {}, file_meta=meta, preamble=b'\0' * 128)
+    dataset.SOPClassUID = '1.2.840.10008.5.1.4.1.1.7'
+    dataset.SOPInstanceUID = '1.2.3.1.1'
+    dataset.Rows, dataset.Columns, dataset.SamplesPerPixel = rows, columns, samples
+    if frames > 1:
+        dataset.NumberOfFrames = frames
+    dataset.PhotometricInterpretation = 'MONOCHROME2' if samples == 1 else 'RGB'
+    if samples > 1:
+        dataset.PlanarConfiguration = planar
+    dataset.BitsAllocated, dataset.BitsStored, dataset.HighBit, dataset.PixelRepresentation = bits, bits, bits - 1, 0
+
+    dtype = np.uint16 if bits == 16 else np.uint8
+    pixels = (np.arange(frames * rows * columns * samples) % (4096 if bits == 16 else 251)).astype(dtype)
+    if transfer_syntax == RLELossless:
+        dataset.PixelData = encapsulate([rle_encode_frame(frame) for frame in pixels.reshape(frames, rows, columns)])
+    else:
+        dataset.PixelData = pixels.tobytes()
+    dataset.is_little_endian = True
+    dataset.is_implicit_VR = transfer_syntax == ImplicitVRLittleEndian
+    dataset.save_as(str(file_path), write_like_original=False)
+
+
+@pytest.mark.parametrize('transfer_syntax, frames, rows, columns, samples, bits, planar, mapped', [
+    (ExplicitVRLittleEndian, 1, 64, 80, 1, 16, 0, True),        # read with the header
+    (ExplicitVRLittleEndian, 2, 512, 600, 1, 16, 0, True),      # above defer_size, memory mapped
+    (ImplicitVRLittleEndian, 3, 64, 80, 1, 8, 0, True),
+    (ExplicitVRLittleEndian, 2, 64, 80, 3, 8, 0, True),         # RGB, pixel interleaved
+    (ExplicitVRLittleEndian, 2, 64, 80, 3, 8, 1, True),         # RGB, planar
+    (RLELossless, 2, 64, 80, 1, 16, 0, False),                  # encapsulated, decoded through pixel_array
+])
+def test_region_matches_pixel_array(tmp_path, transfer_syntax, frames, rows, columns, samples, bits, planar, mapped):
+
+    file_path = str(tmp_path / 'f.dcm')
+    write_dicom(file_path, transfer_syntax, frames, rows, columns, samples, bits, planar)
+
+    pixel_array = dcmread(file_path).pixel_array
+    bounding_box = (10, 5, 50, 40)
+
+    reader = region_reader(file_path)
+    for frame in range(frames):
+        frame_array = pixel_array[frame] if frames > 1 else pixel_array
+        region = reader.get_region(bounding_box, frame)
+        assert region.dtype == frame_array.dtype
+        np.testing.assert_array_equal(region, frame_array[5:40, 10:50])
+
+    assert (reader.pixel_map is not None) == mapped
+    reader.close()
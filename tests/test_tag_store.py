@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+from modules.tag_store import tag_store
+
+
+def test_lookup_by_file_path(tmp_path):
+
+    tag_dicts = {f'/data/f{i}.dcm': {'<(0008,0060)>': '<CT>', '<(0020,0013)>': f'<{i}>', '<(0008,1030)>': None} for i in range(1200)}
+
+    tags = tag_store(os.path.join(tmp_path, 'file_tags.db')).create()
+    tags.store(tag_dicts)
+    tags.close()
+
+    # read only, as a validation worker, across several IN (...) chunks and with paths not in the store
+    tags = tag_store(tags.store_file).open()
+    file_paths = [f'/data/f{i}.dcm' for i in range(0, 1200, 2)] + ['/data/missing.dcm']
+    assert tags.lookup(file_paths) == {file_path: tag_dicts[file_path] for file_path in file_paths[:-1]}
+    tags.remove()
+
+    assert not os.path.exists(tags.store_file)
+
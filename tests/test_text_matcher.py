@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from modules.text_matcher import text_matcher
+
+
+@pytest.mark.parametrize('file_value, answer_value, method, result', [
+    ('<12>', '<12.0>', 'retain', (True, 1.0)),                                                  # numbers compared as numbers
+    ('<12>', '<13>', 'remove', (True, 1.0)),
+    ('<Little Rock Hospital AR>', '<little rock>', 'retain', (True, 1.0)),                      # substring, case folded
+    ('<Little Rock Hospital AR>', '<little rock>', 'remove', (False, 0.0)),
+    ("<The patient's address is 1261 AR 72223>", '<1261 Leawood Street, Little Rock AR 72223>', 'retain', (False, 3 / 7)),     # 1261, ar, 72223 of 7 tokens
+    ('<Anon>', '<1261 Leawood Street, Little Rock AR 72223>', 'remove', (True, 1.0)),           # every answer token removed
+    ('<John of Leawood>', '<Leawood and John>', 'remove', (False, 0.0)),                        # stopwords are not tokens
+])
+def test_match(file_value, answer_value, method, result):
+
+    matcher = text_matcher()
+
+    assert matcher.match(file_value, answer_value, method) == result
+    # cached results are the same
+    assert matcher.match(file_value, answer_value, method) == result
+    assert matcher.get_stats()[0:2] == (1, 1)